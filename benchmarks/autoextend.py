@@ -0,0 +1,70 @@
+"""How long writing rows one after another below the end of an
+autoextend.AutoExtending takes, against resizing to fit every time as it
+used to, with a copy of the old class
+
+    python benchmarks/autoextend.py [rows]
+"""
+
+import os
+import sys
+import time
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scottsright'))
+import autoextend
+
+COLUMNS = 80
+REPEATS = 5 # runs of each, the quickest of which is shown
+
+class ResizingAutoExtending(object):
+    """autoextend.AutoExtending as it was, resizing to fit every write"""
+    def __init__(self, rows, columns):
+        self.array = numpy.zeros((rows, columns), dtype=numpy.character)
+    def __setitem__(self, where, value):
+        if isinstance(where, int):
+            if where >= self.array.shape[0]:
+                self.array.resize(where + 1, self.array.shape[1])
+        elif isinstance(where, tuple) and len(where) == 2:
+            if isinstance(where[0], int) and isinstance(where[1], int):
+                if where[0] > self.array.shape[0]:
+                    self.array.resize(where[0]+1, self.array.shape[1])
+            elif isinstance(where[0], slice):
+                if where[0].stop > self.array.shape[0]:
+                    self.array.resize(where[0].stop, self.array.shape[1])
+        self.array.__setitem__(where, value)
+    def __getattribute__(self, att):
+        if att in ['array']:
+            return object.__getattribute__(self, att)
+        return getattr(self.array, att)
+
+def append_resizing(rows):
+    a = ResizingAutoExtending(0, COLUMNS)
+    for i in xrange(rows):
+        a[i] = 'x' * COLUMNS
+
+def append(rows):
+    a = autoextend.AutoExtending(0, COLUMNS)
+    for i in xrange(rows):
+        a[i] = 'x' * COLUMNS
+
+def append_sliced(rows):
+    a = autoextend.AutoExtending(0, COLUMNS)
+    for i in xrange(rows):
+        a[i:i + 1, :] = 'x' * COLUMNS
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print '%d rows of %d columns, seconds' % (rows, COLUMNS)
+    for name, f, n in [('resizing each write', append_resizing, rows),
+                       ('AutoExtending', append, rows),
+                       ('AutoExtending, slices', append_sliced, rows)]:
+        times = []
+        for _ in range(REPEATS):
+            start = time.time()
+            f(n)
+            times.append(time.time() - start)
+        print '%-24s %8d %10.3f' % (name, n, min(times))
+
+if __name__ == '__main__':
+    main()
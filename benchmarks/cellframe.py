@@ -0,0 +1,99 @@
+"""How long painting and rendering a frame takes, and how much memory the
+frame takes up, painting into lists of fmtstrs and into a CellFrame
+
+The repl has a screenful of highlighted history with an infobox of
+completions over it. Frames are rendered to a terminal controller that
+throws its output away, both redrawing everything and rendering the same
+frame as is already on screen.
+
+    python benchmarks/cellframe.py [frames]
+"""
+
+import os
+import sys
+import time
+from cStringIO import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bpython import importcompletion
+
+from scottsright.repl import Repl, load_config
+from scottsright.terminal import Terminal
+from scottsright.terminalcontrol import TerminalController
+from scottsright.cellframe import CellFrame
+
+ROWS, COLUMNS = 60, 200
+MATCHES = 500
+
+def fmtstr_rows_size(rows):
+    """Bytes taken up by a list of fmtstrs, their pieces and attributes"""
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sys.getsizeof(row.basefmtstrs)
+        for bfs in row.basefmtstrs:
+            size += (sys.getsizeof(bfs) + sys.getsizeof(bfs.__dict__) +
+                     sys.getsizeof(bfs.s) + sys.getsizeof(bfs.atts))
+    return size
+
+def repl():
+    config = load_config()
+    config.module_index = '' # leave the user's alone
+    r = Repl(config)
+    r.__enter__()
+    while not importcompletion.fully_loaded:
+        time.sleep(.01) # walking sys.path for import completion, see rendering.py
+    r.width, r.height = COLUMNS, ROWS
+    r.config.auto_display_list = False # no completion jobs racing the typing
+    for i in range(ROWS):
+        for c in 'value_%d = [%d, "%s", None]  # a comment\r' % (i, i, 'x' * (i % 50)):
+            r.process_event(c)
+    for c in 'value_':
+        r.process_event(c)
+    r.matches = ['value_%d' % i for i in range(MATCHES)]
+    r.current_word = r.matches[0]
+    r.argspec, r.docstring = None, None
+    r.list_win_visible = True
+    return r
+
+def terminal():
+    tc = TerminalController(StringIO(), StringIO())
+    tc.get_screen_size = lambda: (ROWS, COLUMNS)
+    term = Terminal(tc)
+    term.top_usable_row = 1
+    return tc, term
+
+def per_frame(f, frames):
+    start = time.time()
+    for _ in xrange(frames):
+        f()
+    return (time.time() - start) / frames * 1000
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    r = repl()
+    frame = CellFrame(COLUMNS)
+    tc, term = terminal()
+    r.scroll_offset += term.render_to_terminal(r.paint()[0]) # as if the history had scrolled up
+    rows, _ = r.paint()
+    r.paint(frame=frame)
+    def render(array, redraw=True):
+        if redraw:
+            term.invalidate()
+        tc.out_stream = StringIO()
+        term.render_to_terminal(array, (0, 0))
+    results = []
+    for name, paint, array in [('fmtstrs', lambda: r.paint(), rows),
+                               ('CellFrame', lambda: r.paint(frame=frame), frame)]:
+        results.append((name, per_frame(paint, frames),
+                        per_frame(lambda: render(array), frames),
+                        per_frame(lambda: render(array, redraw=False), frames),
+                        frame.chars.nbytes + frame.attrs.nbytes if array is frame
+                        else fmtstr_rows_size(rows)))
+    r.__exit__() # gives back stdout
+    print '%dx%d frames, %d completions shown' % (COLUMNS, ROWS, MATCHES)
+    print '%-12s %12s %12s %12s %12s' % ('', 'paint ms', 'redraw ms', 'no change ms', 'frame bytes')
+    for result in results:
+        print '%-12s %12.2f %12.2f %12.2f %12d' % result
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Frames per second clever_terminal.Terminal renders at a big screen size
+
+Frames are written to a stream that throws them away, so this is the time
+spent building them: turning text into an array of characters, and that
+array (with the default formats, or ones of its own) into escape sequences.
+array_from_text is also timed against the character at a time version it
+replaced, after checking the two give the same arrays.
+
+    python benchmarks/clever_terminal.py [frames]
+"""
+
+import os
+import sys
+import time
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scottsright'))
+import clever_terminal
+import terminalcontrol
+
+ROWS, COLUMNS = 100, 300
+
+class NullStream(object):
+    def write(self, data):
+        pass
+    def flush(self):
+        pass
+
+def array_from_text_by_char(msg, rows, columns):
+    """Terminal.array_from_text as it was, one character at a time"""
+    a = numpy.array([[' ' for _ in range(columns)] for _ in range(rows)])
+    i = 0
+    for c in msg:
+        if i >= a.size:
+            return a
+        elif c in '\r\n':
+            i = ((i / columns) + 1) * columns
+        else:
+            a.flat[i] = c
+        i += 1
+    while len(a) and all(a[-1] == [' ' for _ in range(columns)]):
+        a = a[:-1]
+    return a
+
+def terminal():
+    t = clever_terminal.Terminal(NullStream(), NullStream())
+    t.tc.screen_size = (ROWS, COLUMNS)
+    t.tc.screen_size_counter = terminalcontrol._SIGWINCH_COUNTER
+    t.top_usable_row = 1
+    return t
+
+def fps(frame, frames):
+    start = time.time()
+    for i in xrange(frames):
+        frame(i)
+    return frames / (time.time() - start)
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    random = numpy.random.RandomState(0)
+    t = terminal()
+    texts = ['\n'.join(''.join(chr(c) for c in random.randint(32, 127, random.randint(0, COLUMNS)))
+                       for _ in range(ROWS - 1 - n % 10))
+             for n in range(10)]
+    for text in texts:
+        assert (t.array_from_text(text) == array_from_text_by_char(text, ROWS, COLUMNS)).all()
+    screen = numpy.array([chr(c) for c in random.randint(32, 127, ROWS * COLUMNS)]).reshape(ROWS, COLUMNS)
+    formats = numpy.zeros((ROWS, COLUMNS, 3), dtype=int)
+    formats[:, ::20, 0] = 31
+    formats[:, ::7, 2] = 1
+
+    print '%dx%d frames, per second' % (COLUMNS, ROWS)
+    print '%-40s %10.1f' % ('array_from_text, by character',
+                            fps(lambda i: array_from_text_by_char(texts[i % 10], ROWS, COLUMNS), max(1, frames / 10)))
+    print '%-40s %10.1f' % ('array_from_text',
+                            fps(lambda i: t.array_from_text(texts[i % 10]), frames))
+    print '%-40s %10.1f' % ('render, default formats',
+                            fps(lambda i: t.render_to_terminal(screen), frames))
+    print '%-40s %10.1f' % ('render, formats of its own',
+                            fps(lambda i: t.render_to_terminal(screen, farray=formats), frames))
+    print '%-40s %10.1f' % ('array_from_text and render',
+                            fps(lambda i: t.render_to_terminal(t.array_from_text(texts[i % 10])), frames))
+
+if __name__ == '__main__':
+    main()
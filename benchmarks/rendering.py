@@ -0,0 +1,211 @@
+"""Frames per second, bytes per frame and peak memory of scripted sessions
+painted into a pyte screen
+
+Each scenario's events go through Repl.process_event, and a frame is
+painted with Repl.paint and rendered with Terminal.render_to_terminal after
+every one, as main does. What's written is fed to a pyte screen, which isn't
+part of the time measured, and neither is waiting for background completion.
+
+At the end, the screen is compared with a fresh one that the final frame is
+drawn onto from scratch, since rendering only what changed should come to
+the same thing, and checked for text the scenario should leave on it.
+
+Each scenario runs in a process of its own so that its peak memory is its
+own. Results are compared with those in rendering_baseline.json, which
+--save writes instead.
+
+    python benchmarks/rendering.py [--save] [scenario ...]
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import subprocess
+from cStringIO import StringIO
+
+import pyte
+from bpython import importcompletion
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from scottsright.repl import Repl, load_config
+from scottsright.terminal import Terminal
+from scottsright.terminalcontrol import TerminalController
+from scottsright.cellframe import CellFrame
+from scottsright.events import WindowChangeEvent
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rendering_baseline.json')
+ROWS, COLUMNS = 24, 80
+SLOWER = 1.25 # how much worse than the baseline a number can get unremarked
+
+class Session(object):
+    """A repl painted into a pyte screen the way main paints into a terminal"""
+    def __init__(self, rows, columns):
+        self.size = (rows, columns)
+        self.screen = pyte.Screen(columns, rows)
+        self.stream = pyte.ByteStream()
+        self.stream.attach(self.screen)
+        self.written = []
+        tc = TerminalController(StringIO(), self)
+        tc.get_screen_size = lambda: self.size
+        self.term = Terminal(tc)
+        self.term.top_usable_row = 1
+        config = load_config()
+        config.module_index = '' # leave the user's alone
+        self.repl = Repl(config)
+        self.repl.__enter__()
+        # with no index to load, import completion walks all of sys.path on
+        # a thread of its own, which would be timed along with the events
+        while not importcompletion.fully_loaded:
+            time.sleep(.01)
+        self.repl.height, self.repl.width = self.size
+        self.frame = CellFrame(columns)
+
+    def write(self, data):
+        self.written.append(data)
+
+    def flush(self):
+        pass
+
+    def feed(self):
+        """Shows pyte what's been written, returning how many bytes it was"""
+        data = ''.join(self.written)
+        self.written[:] = []
+        self.stream.feed(data)
+        return len(data)
+
+    def paint(self):
+        _, cursor = self.repl.paint(frame=self.frame)
+        self.repl.scroll_offset += self.term.render_to_terminal(self.frame, cursor)
+
+    def event(self, e):
+        """Handles e and paints a frame, returning the seconds it took"""
+        if isinstance(e, WindowChangeEvent):
+            self.size = (e.rows, e.columns)
+            self.screen.resize(e.rows, e.columns)
+        start = time.time()
+        self.repl.process_event(e)
+        waiting = time.time()
+        self.repl.completion_worker.wait(5)
+        self.repl.update_completion()
+        waited = time.time() - waiting
+        self.paint()
+        return time.time() - start - waited
+
+    def cells(self):
+        """What pyte's screen shows, formatting and cursor included"""
+        return ([[(c.data, c.fg, c.bg, c.bold, c.underscore, c.reverse) for c in line]
+                 for line in self.screen.buffer] +
+                [(self.screen.cursor.x, self.screen.cursor.y)])
+
+    def redrawn(self):
+        """cells() of a fresh screen the last frame is rendered onto"""
+        self.feed()
+        shown = self.cells()
+        self.screen.reset()
+        self.term.invalidate()
+        self.paint()
+        self.feed()
+        redrawn = self.cells()
+        return shown, redrawn
+
+    def text(self):
+        return '\n'.join(self.screen.display)
+
+def typing():
+    """A line three screens wide typed a key at a time"""
+    return list('x = "%s"' % ('abcdefghij' * 24)), ['abcdefghij']
+
+def scrolling():
+    """Enough short lines entered to scroll a screen and a half past"""
+    return list(''.join('x%d = %d\r' % (i, i) for i in range(ROWS * 3 / 2))), ['>>> x35 = 35']
+
+def resize_storm():
+    """The window resized over and over after some output"""
+    sizes = [(ROWS + i % 7, COLUMNS - 3 * (i % 11)) for i in range(200)] + [(ROWS, COLUMNS)]
+    return (list('print "\\n".join(["hello"] * 10)\r') +
+            [WindowChangeEvent(rows, columns) for rows, columns in sizes]), ['hello']
+
+def infobox():
+    """Typing with the infobox showing 500 completions"""
+    keys = list('for i in range(500): globals()["value_%d" % i] = i\r\r') + list('value_')
+    for digit in '123456789' * 3:
+        keys.extend([digit, '\x7f'])
+    return keys, ['>>> value_', 'Infobox test', 'value_1 ']
+
+def output():
+    """A loop printing 10,000 lines, the last 9,000 of which are collapsed"""
+    return (list('for i in range(10000): print i\r\r'),
+            ['997', '998', '999', '... 9000 more lines: ctrl-o to page through them', '>>> '])
+
+SCENARIOS = [typing, scrolling, resize_storm, infobox, output]
+
+def run(scenario):
+    """Runs scenario in this process, returning its results"""
+    events, expected = scenario()
+    session = Session(ROWS, COLUMNS)
+    seconds = 0
+    frame_bytes = 0
+    try:
+        session.paint()
+        session.feed()
+        for e in events:
+            seconds += session.event(e)
+            frame_bytes += session.feed()
+        shown, redrawn = session.redrawn()
+        text = session.text()
+    finally:
+        session.repl.__exit__()
+    problems = (([] if shown == redrawn else ['screen differs from a fresh render of the last frame']) +
+                ['%r not on screen' % s for s in expected if s not in text])
+    return {'frames': len(events),
+            'fps': len(events) / seconds,
+            'bytes_per_frame': frame_bytes / float(len(events)),
+            'peak_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'problems': problems}
+
+def compare(result, baseline):
+    """How result is worse than baseline, if it is"""
+    if not baseline:
+        return 'no baseline'
+    worse = []
+    if result['fps'] * SLOWER < baseline['fps']:
+        worse.append('fps %.0f was %.0f' % (result['fps'], baseline['fps']))
+    if result['bytes_per_frame'] > baseline['bytes_per_frame'] * SLOWER:
+        worse.append('bytes %.0f were %.0f' % (result['bytes_per_frame'], baseline['bytes_per_frame']))
+    if result['peak_kb'] > baseline['peak_kb'] * SLOWER:
+        worse.append('memory %dkB was %dkB' % (result['peak_kb'], baseline['peak_kb']))
+    return ', '.join(worse) or 'ok'
+
+def main():
+    args = sys.argv[1:]
+    if args[:1] == ['--run']:
+        result = run(dict((s.__name__, s) for s in SCENARIOS)[args[1]])
+        sys.__stdout__.write(json.dumps(result))
+        return
+    save = '--save' in args
+    names = [a for a in args if a != '--save'] or [s.__name__ for s in SCENARIOS]
+    baseline = json.load(open(BASELINE)) if os.path.exists(BASELINE) else {}
+    results = {}
+    failed = False
+    print '%-14s %8s %10s %12s %10s  %s' % ('scenario', 'frames', 'fps', 'bytes/frame',
+                                            'peak kB', 'against baseline')
+    for name in names:
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--run', name])
+        result = results[name] = json.loads(output)
+        print '%-14s %8d %10.1f %12.1f %10d  %s' % (
+            name, result['frames'], result['fps'], result['bytes_per_frame'],
+            result['peak_kb'], compare(result, baseline.get(name)))
+        for problem in result['problems']:
+            print '    ' + problem
+            failed = True
+    if save:
+        baseline.update(results)
+        with open(BASELINE, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
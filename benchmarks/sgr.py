@@ -0,0 +1,79 @@
+"""How long termformat.formatted_text takes to encode a row, against the
+character at a time encoder it replaced
+
+Rows are as wide as a big terminal, with formats in runs of a few lengths;
+the two encoders are checked to give the same text first.
+
+    python benchmarks/sgr.py [repeats]
+"""
+
+import os
+import sys
+import timeit
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scottsright'))
+import termformat
+
+WIDTH = 300
+RUN_LENGTHS = [WIDTH, 40, 8, 1]
+
+def formatted_text_by_char(character_list, format_array):
+    """termformat.formatted_text as it was, looking at every character"""
+    RESET = '\033[0m'
+    prev_format = [0, 0, 0]
+    text_list = []
+    for char, f in zip(character_list, format_array):
+        text = ''
+        if prev_format == list(f):
+            text_list.append(char)
+            continue
+        color, on_color, attrs = f
+        if color == on_color == attrs == 0:
+            text_list.append(RESET + char)
+            prev_format = [color, on_color, attrs]
+            continue
+        text = RESET if prev_format != [0, 0, 0] else ''
+        prev_format = list(f)
+        fmt_str = '\033[%dm'
+        if color != 0:
+            text += fmt_str % color
+        if on_color != 0:
+            text += fmt_str % on_color
+        if attrs != 0:
+            for attr, use in zip(range(1, 9), reversed([bool(int(x)) for x in ('0' * 8 + bin(attrs)[2:])[-8:]])):
+                if use:
+                    text += fmt_str % attr
+        text += char
+        text_list.append(text)
+    return ''.join(text_list) + (RESET if prev_format != [0, 0, 0] else '')
+
+def row(run_length, random):
+    """A row of characters, and its formats changing every run_length of them"""
+    chars = numpy.array([chr(c) for c in random.randint(32, 127, WIDTH)])
+    runs = -(-WIDTH // run_length)
+    formats = numpy.zeros((runs, 3), dtype=int)
+    formats[:, 0] = random.choice([0, 31, 32, 33], runs)
+    formats[:, 1] = random.choice([0, 0, 41, 44], runs)
+    formats[:, 2] = random.randint(0, 256, runs) * random.randint(0, 2, runs)
+    return chars, numpy.repeat(formats, run_length, axis=0)[:WIDTH]
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    random = numpy.random.RandomState(0)
+    for _ in range(100):
+        chars, formats = row(random.choice(RUN_LENGTHS), random)
+        assert (termformat.formatted_text(chars, formats) ==
+                formatted_text_by_char(chars, formats))
+    print '%d character rows, microseconds per row' % WIDTH
+    print '%-12s %12s %12s %8s' % ('run length', 'by char', 'by run', 'speedup')
+    for run_length in RUN_LENGTHS:
+        chars, formats = row(run_length, random)
+        times = [min(timeit.repeat(lambda: encode(chars, formats), number=repeats, repeat=3))
+                 / repeats * 1e6
+                 for encode in (formatted_text_by_char, termformat.formatted_text)]
+        print '%-12d %12.1f %12.1f %7.1fx' % (run_length, times[0], times[1], times[0] / times[1])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Time to first prompt of spy, and what importing its modules costs
+
+Runs spy in a pseudo-terminal, answering its cursor position queries, and
+times how long it takes from starting python to the first prompt being
+drawn. Each module's import cost is timed in a fresh interpreter, so it
+includes everything that module imports.
+
+    python benchmarks/startup.py [runs]
+"""
+
+import os
+import sys
+import pty
+import time
+import errno
+import fcntl
+import select
+import signal
+import struct
+import termios
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SPY = os.path.join(ROOT, 'spy')
+PROMPT = '>>> '
+ROWS, COLUMNS = 24, 80
+QUERY_CURSOR_POSITION = '\x1b[6n'
+CURSOR_POSITION = '\x1b[1;1R'
+EOF_KEY = '\x04' # ctrl-d quits spy
+TIMEOUT = 10
+
+MODULES = ['fmtstr.fmtstr', 'pygments.lexers', 'bpython.repl',
+           'scottsright.terminalcontrol', 'scottsright.terminal',
+           'scottsright.repl']
+
+def environment():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([ROOT] + filter(None, [env.get('PYTHONPATH')]))
+    return env
+
+def read(fd, timeout):
+    """Returns what fd has to read within timeout seconds, '' at its end"""
+    if not select.select([fd], [], [], timeout)[0]:
+        raise RuntimeError('spy timed out')
+    try:
+        return os.read(fd, 4096)
+    except OSError as e:
+        if e.errno == errno.EIO: # the child closed the pty
+            return ''
+        raise
+
+def answer_queries(fd, data):
+    """Replies to the cursor position queries in data like a terminal would"""
+    for _ in range(data.count(QUERY_CURSOR_POSITION)):
+        os.write(fd, CURSOR_POSITION)
+
+def time_to_first_prompt():
+    """Seconds from forking spy off to it drawing a prompt"""
+    start = time.time()
+    pid, fd = pty.fork()
+    if pid == 0:
+        fcntl.ioctl(0, termios.TIOCSWINSZ, struct.pack('HHHH', ROWS, COLUMNS, 0, 0))
+        os.chdir(tempfile.gettempdir()) # where spy writes its log
+        os.execve(sys.executable, [sys.executable, SPY], environment())
+    output = ''
+    try:
+        while PROMPT not in output:
+            data = read(fd, TIMEOUT)
+            if not data:
+                raise RuntimeError('spy exited before drawing a prompt: %r' % output)
+            answer_queries(fd, data)
+            output += data
+        elapsed = time.time() - start
+        os.write(fd, EOF_KEY)
+        data = read(fd, TIMEOUT)
+        while data:
+            answer_queries(fd, data)
+            data = read(fd, TIMEOUT)
+    except:
+        os.kill(pid, signal.SIGKILL)
+        raise
+    finally:
+        os.waitpid(pid, 0)
+        os.close(fd)
+    return elapsed
+
+def import_time(module):
+    """Seconds a fresh interpreter takes to import module"""
+    code = ('import time; t = time.time(); import %s; print time.time() - t' % module)
+    return float(subprocess.check_output([sys.executable, '-c', code], env=environment()))
+
+def interpreter_time():
+    """Seconds it takes to start and stop python doing nothing"""
+    start = time.time()
+    subprocess.check_call([sys.executable, '-c', 'pass'])
+    return time.time() - start
+
+def summary(times):
+    times = sorted(times)
+    return 'min %6.1fms  median %6.1fms' % (times[0] * 1000, times[len(times) // 2] * 1000)
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    print 'python startup         %s' % summary([interpreter_time() for _ in range(runs)])
+    print 'time to first prompt   %s' % summary([time_to_first_prompt() for _ in range(runs)])
+    print
+    print 'import cost, including what each module imports:'
+    for module in MODULES:
+        print '  %-28s %s' % (module, summary([import_time(module) for _ in range(runs)]))
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,12 @@
 import numpy
 
-#TODO do something cooler and more robust like
-#http://stackoverflow.com/a/9059858/398212
-
 class AutoExtending(object):
     """Numpy array wrapper that automatically extends rows down
 
+    Rows are kept in an array with room for more than are in use, which
+    doubles when it runs out, so writing rows one after another below the
+    last copies each row only a few times in all.
+
     >>> a = AutoExtending(10, 14)
     >>> a.shape
     (10, 14)
@@ -17,32 +18,104 @@ class AutoExtending(object):
     >>> a[200, 1] = 'i'
     >>> a[200, 1]
     'i'
+    >>> len(a), a.capacity >= 201
+    (201, True)
+
+    Negative indices and open ended slices count from the last row in use,
+    never extending
+
+    >>> a[-1, 2:] = 'k' * 12
+    >>> a[-1].tostring()
+    '\\x00ikkkkkkkkkkkk'
+    >>> a[199:] = 'l'
+    >>> len(a), a[200, 0]
+    (201, 'l')
+    >>> a.append('m'); len(a), a[-1, 0]
+    (202, 'm')
+    >>> a.truncate(200); a[201, 0] = 'n'; a[200, 0]
+    ''
+    >>> a.truncate(200); a.compact(); a.capacity
+    200
     """
-    def __init__(self, rows, columns):
-        self.array = numpy.zeros((rows, columns), dtype=numpy.character)
+    def __init__(self, rows, columns, dtype=numpy.character):
+        self.array = numpy.zeros((rows, columns), dtype=dtype)
+        self.rows = rows # rows in use; the array has room for more
+
+    @property
+    def capacity(self):
+        return self.array.shape[0]
+
+    @property
+    def shape(self):
+        return (self.rows, self.array.shape[1])
+
+    def view(self):
+        """The rows in use, as a numpy array sharing their memory"""
+        return self.array[:self.rows]
+
+    def extend_to(self, rows):
+        """Makes sure there are at least rows rows in use"""
+        if rows <= self.rows:
+            return
+        if rows > self.capacity:
+            array = numpy.zeros((max(rows, 2 * self.capacity), self.array.shape[1]),
+                                dtype=self.array.dtype)
+            array[:self.rows] = self.array[:self.rows]
+            self.array = array
+        self.rows = rows
+
+    def truncate(self, rows):
+        """Stops using the rows past rows, clearing them so that they're
+        zeros again if they come back into use"""
+        if rows < self.rows:
+            self.array[rows:self.rows] = numpy.zeros(1, dtype=self.array.dtype)
+            self.rows = rows
+
+    def compact(self):
+        """Gives back the room kept for rows not yet in use"""
+        self.array = self.array[:self.rows].copy()
+
+    def append(self, row):
+        """Writes row below the last row in use"""
+        self[self.rows] = row
+
     def __setitem__(self, where, value):
-        if isinstance(where, int):
-            if where >= self.array.shape[0]:
-                self.array.resize(where + 1, self.array.shape[1])
-        elif isinstance(where, tuple) and len(where) == 2:
-            if isinstance(where[0], int) and isinstance(where[1], int):
-                if where[0] > self.array.shape[0]:
-                    self.array.resize(where[0]+1, self.array.shape[1])
-            elif isinstance(where[0], slice):
-                if where[0].stop > self.array.shape[0]:
-                    self.array.resize(where[0].stop, self.array.shape[1])
-            else:
-                raise IndexError("slice spec "+repr(where)+" is no good")
-        else:
-            print 'I bet this will raise a slice index error'
-        self.array.__setitem__(where, value)
-    def __getitem__(self, *args): return self.array.__getitem__(*args)
-    def __len__(self, *args): return self.array.__len__(*args)
-    def __repr__(self): return self.array.__repr__()
-    def __getattribute__(self, att):
-        if att in ['array']:
-            return object.__getattribute__(self, att)
-        return getattr(self.array, att)
+        # the common cases, made quick: rows counted from the top are in the
+        # same place in self.array as in the view, so once there's room for
+        # them they're written there directly
+        rows = where[0] if type(where) is tuple else where
+        if type(rows) is slice:
+            stop = rows.stop
+            if stop >= 0 and rows.step is None and (rows.start or 0) >= 0: # None < 0
+                if stop > self.rows:
+                    self.extend_to(stop)
+                self.array[where] = value
+                return
+        elif type(rows) is int and rows >= 0:
+            if rows >= self.rows:
+                self.extend_to(rows + 1)
+            self.array[where] = value
+            return
+        self.extend_to(rows_to_fit(rows))
+        self.view()[where] = value
+    def __getitem__(self, where): return self.view()[where]
+    def __len__(self): return self.rows
+    def __repr__(self): return repr(self.view())
+    def __getattr__(self, att):
+        if att in ('array', 'rows'): # not set yet, when being copied
+            raise AttributeError(att)
+        return getattr(self.view(), att)
+
+def rows_to_fit(rows):
+    """How many rows an array must have for index rows (an int or slice) to
+    be written to; negative indices and slice ends don't extend it"""
+    if isinstance(rows, (int, long, numpy.integer)):
+        return rows + 1
+    if isinstance(rows, slice):
+        if rows.step is not None and rows.step < 0:
+            return rows.start + 1 if rows.start is not None else 0
+        return rows.stop if rows.stop is not None else 0
+    return 0
 
 if __name__ == '__main__':
     import doctest
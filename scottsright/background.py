@@ -0,0 +1,90 @@
+"""Running slow work, like completion, off the input thread"""
+
+import logging
+import threading
+import time
+
+class BackgroundWorker(object):
+    """Runs the most recently submitted job on a daemon thread
+
+    Submitting a job cancels the one waiting to run, and makes the result of
+    any older job still running get thrown away when it finishes; Python
+    can't interrupt a thread, so it's left to finish on its own.
+
+    >>> w = BackgroundWorker()
+    >>> w.submit(lambda: 1), w.submit(lambda: 2)
+    (1, 2)
+    >>> w.wait(), w.take(), w.take()
+    (True, 2, None)
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.version = 0 # of the newest job submitted
+        self.job = None # (version, function) waiting to run
+        self.running = None # version of the job running
+        self.result = None # (version, result) of the newest job, once it's done
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, function):
+        """Queues function to be called in the background, returning its version"""
+        with self.condition:
+            self.version += 1
+            self.job = (self.version, function)
+            self.result = None
+            self.condition.notify_all()
+            return self.version
+
+    def cancel(self):
+        """Drops the newest job and its result, returning whether it hadn't
+        finished yet"""
+        with self.condition:
+            unfinished = self.busy
+            self.version += 1
+            self.job = self.result = None
+            self.condition.notify_all()
+            return unfinished
+
+    @property
+    def busy(self):
+        """Whether the newest job has yet to finish"""
+        return self.job is not None or self.running == self.version
+
+    def take(self):
+        """Returns the result of the newest job if it's finished and hasn't
+        been taken yet, else None"""
+        with self.condition:
+            result, self.result = self.result, None
+        return result[1] if result else None
+
+    def wait(self, timeout=None):
+        """Blocks until the newest job is done, returning whether it is"""
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while self.busy:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            return not self.busy
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.job is None:
+                    self.condition.wait()
+                (self.running, function), self.job = self.job, None
+            try:
+                result = function()
+            except Exception:
+                logging.exception('background job failed')
+                result = None
+            with self.condition:
+                if self.running == self.version and result is not None:
+                    self.result = (self.running, result)
+                self.running = None
+                self.condition.notify_all()
+
+if __name__ == '__main__':
+    import doctest; doctest.testmod()
@@ -0,0 +1,70 @@
+"""Streams standing in for sys.stdout and sys.stderr while the repl runs
+
+Rather than collecting everything ever printed to be read back once the code
+that printed it is done, each line is handed on as soon as it's finished, so
+it can be shown while the code's still running.
+"""
+
+class OutputCapture(object):
+    """A file that passes each line written to it to on_lines, keeping only
+    the line being written
+
+    The line being written is kept in pieces, only joined once a newline
+    comes, so writing a character at a time takes no longer than writing
+    the line at once; a line reaching max_bytes is passed on as it is.
+
+    >>> lines = []
+    >>> f = OutputCapture(lines.extend)
+    >>> f.write('a\\nb'); lines
+    ['a']
+    >>> f.write('c\\n'); f.write('d'); f.finish(); lines
+    ['a', 'bc', 'd']
+    >>> f = OutputCapture(lines.extend, max_bytes=4)
+    >>> for c in 'abcdef': f.write(c)
+    >>> lines[3:], f.partial
+    (['abcd'], ['e', 'f'])
+    """
+    encoding = None
+    softspace = 0 # used by the print statement
+
+    def __init__(self, on_lines, max_bytes=0):
+        self.on_lines = on_lines
+        self.max_bytes = max_bytes # 0 for no limit
+        self.partial = [] # the end of what's been written, not yet a line
+        self.partial_bytes = 0
+
+    def write(self, data):
+        if isinstance(data, unicode):
+            data = data.encode('utf8')
+        if '\n' in data:
+            lines = (''.join(self.partial) + data).split('\n')
+            last = lines.pop()
+            self.partial = [last] if last else []
+            self.partial_bytes = len(last)
+            self.on_lines(lines)
+        elif data:
+            self.partial.append(data)
+            self.partial_bytes += len(data)
+        if self.max_bytes and self.partial_bytes >= self.max_bytes:
+            self.finish()
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def finish(self):
+        """Passes on the last line even though it's unfinished"""
+        if self.partial:
+            lines = [''.join(self.partial)]
+            self.partial = []
+            self.partial_bytes = 0
+            self.on_lines(lines)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+if __name__ == '__main__':
+    import doctest; doctest.testmod()
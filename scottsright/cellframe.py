@@ -0,0 +1,244 @@
+"""Frames to paint the repl into as planes of numbers, one number per cell
+
+Painting into lists of fmtstrs builds an object with a dict of attributes
+for every run of formatting, and pasting an infobox over the history means
+slicing those up and parsing them back out of escape sequences. A CellFrame
+holds a frame as two arrays instead: the codepoint of each cell, and its
+formatting packed into a uint32, so pasting is copying into slices and
+comparing frames is comparing arrays.
+
+A codepoint of 0 marks a cell nothing's been painted in; a row's painted
+cells are always the ones at its start.
+"""
+
+import numpy
+
+from fmtstr.fmtstr import fmtstr, FmtStr
+from fmtstr.termformatconstants import STYLES
+
+from autoextend import AutoExtending
+
+# packed formatting: the foreground color's SGR code in the lowest byte, the
+# background's in the next, then a bit for each style
+STYLE_NAMES = ('bold', 'dark', 'underline', 'blink', 'invert')
+STYLE_SHIFT = 16
+RESET = '\x1b[0m'
+SGR = '\x1b[%dm'
+
+PACKED = {} # fmtstr attribute items -> pack()
+SEQUENCES = {} # (packed, after_formatted) -> sequence()
+
+def pack(atts):
+    """The uint32 a dict of fmtstr attributes is packed into
+
+    >>> hex(pack({'fg': 31, 'bg': 44, 'bold': True}))
+    '0x12c1f'
+    """
+    packed = atts.get('fg', 0) | atts.get('bg', 0) << 8
+    for bit, name in enumerate(STYLE_NAMES):
+        if atts.get(name):
+            packed |= 1 << (STYLE_SHIFT + bit)
+    return packed
+
+def sequence(packed, after_formatted):
+    """What switches to the formatting packed, from formatted text if
+    after_formatted or from unformatted text if not
+
+    >>> sequence(pack({'fg': 31, 'underline': True}), True)
+    '\\x1b[0m\\x1b[31m\\x1b[4m'
+    """
+    if not packed:
+        return RESET
+    codes = []
+    if packed & 0xff:
+        codes.append(packed & 0xff)
+    if packed >> 8 & 0xff:
+        codes.append(packed >> 8 & 0xff)
+    codes.extend(STYLES[name] for bit, name in enumerate(STYLE_NAMES)
+                 if packed & 1 << (STYLE_SHIFT + bit))
+    return (RESET if after_formatted else '') + ''.join(SGR % code for code in codes)
+
+def chunks(line):
+    """The (text, packed formatting) runs of a str, unicode or fmtstr"""
+    if isinstance(line, str) and '\x1b' not in line:
+        return [(line, 0)]
+    if not isinstance(line, FmtStr):
+        line = fmtstr(line)
+    result = []
+    for bfs in line.basefmtstrs:
+        if not bfs.atts:
+            result.append((bfs.s, 0))
+            continue
+        key = tuple(bfs.atts.iteritems()) # equal dicts seldom differ in order
+        packed = PACKED.get(key)
+        if packed is None:
+            packed = PACKED[key] = pack(bfs.atts)
+        result.append((bfs.s, packed))
+    return result
+
+def codepoints(s):
+    """The numbers to put in the cells for the characters of s"""
+    if isinstance(s, unicode):
+        return numpy.frombuffer(s.encode('utf-32-le'), dtype='<u4')
+    return numpy.frombuffer(s, dtype=numpy.uint8) if s else numpy.zeros(0, dtype=numpy.uint8)
+
+def text(codes):
+    """The characters for an array of codepoints: bytes as they are, and
+    anything beyond as utf8"""
+    if not len(codes) or codes.max() < 256:
+        return codes.astype(numpy.uint8).tostring()
+    return u''.join(unichr(c) for c in codes).encode('utf8')
+
+def encode(codes, packed):
+    """The text for cells with codepoints codes and formatting packed, with
+    the escape sequences to format it
+
+    The formatting's only looked at where it changes, found all at once.
+
+    >>> encode(codepoints('hi!'), numpy.array([0, 31, 31]))
+    'h\\x1b[31mi!\\x1b[0m'
+    """
+    if not packed.any():
+        return text(codes)
+    starts = [0] + (numpy.flatnonzero(numpy.diff(packed)) + 1).tolist()
+    pieces = []
+    previous = 0
+    for start, end in zip(starts, starts[1:] + [len(codes)]):
+        f = int(packed[start])
+        if f != previous:
+            key = (f, bool(previous))
+            seq = SEQUENCES.get(key)
+            if seq is None:
+                seq = SEQUENCES[key] = sequence(f, bool(previous))
+            pieces.append(seq)
+            previous = f
+        pieces.append(text(codes[start:end]))
+    if previous:
+        pieces.append(RESET)
+    return ''.join(pieces)
+
+class CellFrame(object):
+    """Rows of cells columns wide, as many rows as have been painted
+
+    >>> f = CellFrame(6)
+    >>> f.blit(['hello', fmtstr('abc', 'red')], 0)
+    >>> f.blit([fmtstr('X', 'bold')], 1, 4)
+    >>> len(f), f.widths().tolist()
+    (2, [5, 5])
+    >>> f.encode(1)
+    '\\x1b[31mabc\\x1b[0m \\x1b[1mX\\x1b[0m'
+    """
+    def __init__(self, columns, rows=0):
+        self.columns = columns
+        self.chars = AutoExtending(rows, columns, numpy.uint32)
+        self.attrs = AutoExtending(rows, columns, numpy.uint32)
+        # id of fmtstr -> (fmtstr, codepoints, formatting) for the fmtstrs
+        # painted into the last frame and this one, as most rows of the next
+        # frame are painted from the same fmtstrs, which don't change
+        self.last_cells = {}
+        self.cells = {}
+
+    def clear(self, columns):
+        """Empties the frame for painting another, columns wide"""
+        if columns != self.columns:
+            self.__init__(columns)
+        else:
+            self.chars.truncate(0)
+            self.attrs.truncate(0)
+            self.last_cells, self.cells = self.cells, {}
+
+    def __len__(self):
+        return len(self.chars)
+
+    def widths(self):
+        """How many cells of each row have been painted"""
+        return numpy.count_nonzero(self.chars.view(), axis=1) if len(self) else numpy.zeros(0, int)
+
+    def planes(self, columns):
+        """The codepoint and formatting arrays of the rows painted, cut off
+        or padded out to columns"""
+        chars, attrs = self.chars.view(), self.attrs.view()
+        if columns == self.columns:
+            return chars, attrs
+        fitted = numpy.zeros((2, len(self), columns), dtype=numpy.uint32)
+        shared = min(columns, self.columns)
+        fitted[0, :, :shared] = chars[:, :shared]
+        fitted[1, :, :shared] = attrs[:, :shared]
+        return fitted[0], fitted[1]
+
+    def blit(self, rows, top, left=0):
+        """Paints rows, each a str, unicode or fmtstr, from row top and column
+        left, cutting them off at the right edge
+
+        Rows are added as needed, and the gap between the end of an existing
+        row and left is filled with spaces, like replpainter.blit."""
+        self.chars.extend_to(top + len(rows))
+        self.attrs.extend_to(top + len(rows))
+        chars, attrs = self.chars.array, self.attrs.array
+        for row, line in enumerate(rows, top):
+            if left and not chars[row, left - 1]:
+                start = numpy.count_nonzero(chars[row, :left])
+                chars[row, start:left] = ord(' ')
+                attrs[row, start:left] = 0
+            codes, packed = self.line_cells(line)
+            codes = codes[:max(0, self.columns - left)]
+            chars[row, left:left + len(codes)] = codes
+            attrs[row, left:left + len(codes)] = packed[:len(codes)]
+
+    def blit_box(self, top, lines, width, height):
+        """Paints lines width wide inside a border, the whole no more than
+        height rows, from row top; the same as blitting replpainter.border's
+        rows, without making fmtstrs of them"""
+        if not height:
+            return
+        self.chars.extend_to(top + height)
+        self.attrs.extend_to(top + height)
+        chars, attrs = self.chars.array, self.attrs.array
+        edge = codepoints('+' + '-' * width + '+')[:self.columns]
+        side = codepoints('|' + ' ' * width + '|')[:self.columns]
+        rows = [edge] + [side] * len(lines) + [edge]
+        chars[top:top + height, :len(edge)] = rows[:height]
+        attrs[top:top + height, :len(edge)] = 0
+        inside = max(0, min(width, self.columns - 1))
+        for row, line in enumerate(lines[:height - 1], top + 1):
+            codes, packed = self.line_cells(line)
+            codes = codes[:inside]
+            chars[row, 1:1 + len(codes)] = codes
+            attrs[row, 1:1 + len(codes)] = packed[:len(codes)]
+
+    def line_cells(self, line):
+        """The codepoints and packed formatting of the cells of line"""
+        if isinstance(line, FmtStr):
+            cells = self.cells.get(id(line)) or self.last_cells.get(id(line))
+            if cells is not None and cells[0] is line:
+                self.cells[id(line)] = cells
+                return cells[1:]
+        # the whole line's converted at once, its formatting repeated out
+        # from one value per run
+        runs = chunks(line)
+        texts = [s for s, _ in runs]
+        if all(type(s) is str for s in texts):
+            codes = codepoints(''.join(texts))
+        else:
+            texts = [s if isinstance(s, unicode) else s.decode('utf8', 'replace')
+                     for s in texts]
+            codes = codepoints(u''.join(texts))
+        packed = numpy.repeat(numpy.array([f for _, f in runs], dtype=numpy.uint32),
+                              [len(s) for s in texts])
+        if isinstance(line, FmtStr):
+            self.cells[id(line)] = (line, codes, packed)
+        return codes, packed
+
+    def encode(self, row, start=0, end=None):
+        """The characters of cells start to end of row, with the escape
+        sequences to format them, and a reset at the end if they need it"""
+        width = numpy.count_nonzero(self.chars.array[row])
+        end = width if end is None else min(end, width)
+        return encode(self.chars.array[row, start:end], self.attrs.array[row, start:end])
+
+    def lines(self):
+        """Each row as it would be shown, for tests and debugging"""
+        return [self.encode(row) for row in range(len(self))]
+
+if __name__ == '__main__':
+    import doctest; doctest.testmod()
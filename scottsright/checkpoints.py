@@ -0,0 +1,210 @@
+"""Forked copies of the repl to rewind to, so undo needn't rerun everything
+
+Undo throws away the interpreter and runs the lines that are left again,
+including whatever slow loading a session started with. Instead, every so
+many lines, and after any slow line, the repl forks: the child is a paused
+copy of the whole process at that point in history. Undoing resumes the
+newest copy from at or before the line being rewound to, sending it the
+lines it still has to run to catch up, and the process that was running
+becomes a waiter, so whoever started the repl keeps waiting until the
+session is over.
+
+A paused copy exits once nothing could resume it any more, which is when
+every process holding the other end of its pipe is gone.
+"""
+
+import os
+import sys
+import errno
+import fcntl
+import signal
+import struct
+import logging
+import resource
+import cPickle as pickle
+from contextlib import contextmanager
+
+HEADER = struct.Struct('!I') # length of the pickled message that follows
+
+# what a process that's handed the session over to a checkpoint becomes:
+# waits for its children, and exits with the worst status any exited with
+WAITER = """
+import os, sys
+worst = 0
+while True:
+    try:
+        _, status = os.wait()
+    except OSError:
+        break
+    if os.WIFEXITED(status):
+        worst = max(worst, os.WEXITSTATUS(status))
+sys.exit(worst)
+"""
+
+def close_on_exec(fd):
+    fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+
+def read_exactly(fd, n):
+    """Reads n bytes from fd, or returns None if it ends first"""
+    data = ''
+    while len(data) < n:
+        try:
+            chunk = os.read(fd, n - len(data))
+        except OSError as e:
+            if e.errno == errno.EINTR: # a window change, say
+                continue
+            raise
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+def write_all(fd, data):
+    while data:
+        try:
+            data = data[os.write(fd, data):]
+        except OSError as e:
+            if e.errno != errno.EINTR:
+                raise
+
+@contextmanager
+def logging_locked():
+    """Holds logging's locks, so no other thread is partway through logging
+    when the process forks (os.fork sees to the import lock itself)"""
+    logging._acquireLock()
+    try:
+        handlers = filter(None, [ref() for ref in logging._handlerList])
+        for handler in handlers:
+            handler.acquire()
+        try:
+            yield
+        finally:
+            for handler in reversed(handlers):
+                handler.release()
+    finally:
+        logging._releaseLock()
+
+@contextmanager
+def locks_held(locks):
+    """Holds locks, so that no other thread is partway through changing
+    what they guard when the process forks"""
+    for lock in locks:
+        lock.acquire()
+    try:
+        yield
+    finally:
+        for lock in reversed(locks):
+            lock.release()
+
+def resident_bytes():
+    """Memory this process has resident, or at most has had where that's
+    all that can be found out"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (IOError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+class Checkpoints(object):
+    """Paused copies of this process, each at some length of history
+
+    A checkpoint is taken every `every` lines, and after any line that took
+    `slow` seconds or more to run; no more than `limit` are kept, and none
+    at all if it's 0.
+
+    A copy shares memory with the process it was forked from until either
+    changes it, so each can come to take as much as the process had when it
+    was taken: none are taken while more than max_bytes is resident, unless
+    that's 0."""
+    def __init__(self, every, slow, limit, max_bytes=0):
+        self.every = every
+        self.slow = slow
+        self.limit = limit if hasattr(os, 'fork') else 0
+        self.max_bytes = max_bytes
+        self.checkpoints = [] # (length of history, pid, fd to resume it), oldest first
+
+    def due(self, length, seconds):
+        """Whether to take a checkpoint at length lines of history, the
+        last of which took seconds to run"""
+        if not self.limit:
+            return False
+        last = self.checkpoints[-1][0] if self.checkpoints else 0
+        if length <= last:
+            return False
+        if length - last < self.every and seconds < self.slow:
+            return False
+        return not self.max_bytes or resident_bytes() <= self.max_bytes
+
+    def take(self, length, locks=()):
+        """Forks a checkpoint at length lines of history, holding locks that
+        other threads share with this one meanwhile
+
+        Returns None in the process that carries on; the checkpoint returns
+        the message it's resumed with, or exits if it never is."""
+        r, w = os.pipe()
+        close_on_exec(r)
+        close_on_exec(w)
+        try:
+            with logging_locked(), locks_held(locks):
+                pid = os.fork()
+        except OSError:
+            logging.exception('taking a checkpoint failed')
+            os.close(r)
+            os.close(w)
+            return None
+        if pid:
+            os.close(r)
+            self.checkpoints.append((length, pid, w))
+            if len(self.checkpoints) > self.limit:
+                self.discard(self.thinnest())
+            return None
+        os.close(w)
+        header = read_exactly(r, HEADER.size)
+        if header is None:
+            os._exit(0)
+        message = pickle.loads(read_exactly(r, HEADER.unpack(header)[0]))
+        os.close(r)
+        return message
+
+    def thinnest(self):
+        """The checkpoint that saves the least rerunning, by being closest to
+        the one before it; never the newest"""
+        lengths = [0] + [length for length, _, _ in self.checkpoints]
+        return min(range(len(self.checkpoints) - 1),
+                   key=lambda i: lengths[i + 1] - lengths[i])
+
+    def discard(self, i):
+        length, pid, fd = self.checkpoints.pop(i)
+        os.close(fd)
+        try:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        except OSError:
+            pass # gone already, or forked by a process before this one
+
+    def restore(self, length, message):
+        """Resumes the newest checkpoint at or before length lines of
+        history with message, and hands the session over to it
+
+        Doesn't return if there was one to resume."""
+        while self.checkpoints:
+            if self.checkpoints[-1][0] > length:
+                self.discard(len(self.checkpoints) - 1)
+                continue
+            _, pid, fd = self.checkpoints.pop()
+            data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+            try:
+                write_all(fd, HEADER.pack(len(data)) + data)
+            except OSError as e:
+                if e.errno != errno.EPIPE:
+                    raise
+                os.close(fd) # discarded by a process it was copied from
+                continue
+            self.hand_over()
+
+    def hand_over(self):
+        """Becomes a process that waits for its children, giving up the
+        memory of this one"""
+        sys.__stdout__.flush()
+        os.execv(sys.executable, [sys.executable, '-c', WAITER])
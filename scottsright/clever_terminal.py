@@ -1,5 +1,6 @@
 """Terminal Wrapper which renders 2d arrays of characters to terminal"""
 
+import re
 import signal
 import tty
 import sys
@@ -18,6 +19,9 @@ logging.basicConfig(filename='terminal.log',level=logging.DEBUG)
 
 SIGWINCH_COUNTER = 0
 
+NEWLINE = re.compile('[\r\n]')
+DEFAULT_FORMAT = (termformatconstants.GREEN, 0, termformatconstants.BOLD)
+
 
 class Terminal(object):
     """
@@ -49,7 +53,8 @@ class Terminal(object):
         self.in_stream = in_stream
         self.out_stream = out_stream
         self.in_buffer = []
-        self.tc = terminalcontrol.TCPartialler(lambda: self.in_stream, lambda: self.out_stream, lambda: self.in_buffer)
+        self.tc = terminalcontrol.TerminalController(in_stream, out_stream)
+        self.format_plane = numpy.empty((0, 0, 3), dtype=int) # see default_formats
 
     def __enter__(self):
         self.original_stty = subprocess.check_output(['stty', '-g'])
@@ -59,7 +64,7 @@ class Terminal(object):
             SIGWINCH_COUNTER += 1
         signal.signal(signal.SIGWINCH, signal_handler)
         self.sigwinch_counter = SIGWINCH_COUNTER - 1
-        self.top_usable_row, _ = self.tc.get_screen_position()
+        self.top_usable_row, _ = self.tc.get_cursor_position()
         logging.debug('initial top_usable_row: %d' % self.top_usable_row)
         return self
 
@@ -77,20 +82,22 @@ class Terminal(object):
             and render the rest of it, then return how much we scrolled down
         """
         #TODO add cool render-on-change caching
-        #TODO take a formatting array with same dimensions as array
 
         if farray is None:
-            farray = numpy.zeros((array.shape[0], array.shape[1], 3), dtype=int)
-            farray[:, :, 0] = termformatconstants.GREEN
-            farray[:, :, 1] = 0 #termformatconstants.ON_GREEN
-            farray[:, :, 2] = termformatconstants.BOLD
+            farray = self.default_formats(array.shape)
 
         height, width = self.tc.get_screen_size()
         rows_for_use = range(self.top_usable_row, height + 1)
         shared = min(len(array), len(rows_for_use))
+        with self.tc.frame():
+            offscreen_scrolls = self.write_rows(array, farray, rows_for_use, shared, height)
+            self.tc.set_cursor_position((cursor_pos[0]-offscreen_scrolls+self.top_usable_row, cursor_pos[1]+1))
+        return offscreen_scrolls
+
+    def write_rows(self, array, farray, rows_for_use, shared, height):
         for row, line, fline in zip(rows_for_use[:shared], array[:shared], farray[:shared]):
             self.tc.set_cursor_position((row, 1))
-            self.out_stream.write(termformat.formatted_text(line, fline))
+            self.tc.write(termformat.formatted_text(row_text(line), fline))
             self.tc.erase_rest_of_line()
         #logging.debug('array: '+repr(array))
         #logging.debug('shared: '+repr(shared))
@@ -111,11 +118,21 @@ class Terminal(object):
                 offscreen_scrolls += 1
             logging.debug('new top_usable_row: %d' % self.top_usable_row)
             self.tc.set_cursor_position((height, 1)) # since scrolling moves the cursor
-            self.out_stream.write(termformat.formatted_text(line, fline))
-
-        self.tc.set_cursor_position((cursor_pos[0]-offscreen_scrolls+self.top_usable_row, cursor_pos[1]+1))
+            self.tc.write(termformat.formatted_text(row_text(line), fline))
         return offscreen_scrolls
 
+    def default_formats(self, shape):
+        """Format array for an array of characters of shape with none of its own
+
+        Every call gets a view of the same plane, only allocated again when
+        a bigger one's needed, so it mustn't be written to."""
+        rows, columns = shape
+        if rows > self.format_plane.shape[0] or columns > self.format_plane.shape[1]:
+            self.format_plane = numpy.empty((max(rows, self.format_plane.shape[0]),
+                                             max(columns, self.format_plane.shape[1]), 3), dtype=int)
+            self.format_plane[:] = DEFAULT_FORMAT
+        return self.format_plane[:rows, :columns]
+
     def get_event(self):
         chars = []
         while True:
@@ -139,25 +156,33 @@ class Terminal(object):
                 continue
 
     def array_from_text(self, msg):
+        """Array of characters the size of the screen, msg written into it
+        from the top left, with the blank rows at the bottom dropped
+
+        Each line of msg is copied into one buffer in a single slice, and the
+        buffer is then looked at as rows. If msg doesn't fit, the array is
+        returned whole."""
         rows, columns = self.tc.get_screen_size()
-        a = numpy.array([[' ' for _ in range(columns)] for _ in range(rows)])
+        size = rows * columns
+        buf = bytearray(' ' * size)
+        a = numpy.frombuffer(buf, dtype='S1').reshape(rows, columns)
         i = 0
-        for c in msg:
-            if i >= a.size:
+        for n, line in enumerate(NEWLINE.split(msg)):
+            if n:
+                if i >= size:
+                    return a
+                i = ((i / columns) + 1) * columns + 1
+            if line and i + len(line) > size:
+                buf[i:size] = line[:max(0, size - i)]
                 return a
-            elif c in '\r\n':
-                i = ((i / columns) + 1) * columns
-            else:
-                a.flat[i] = c
-            i += 1
-        for r in reversed(range(rows)):
-            if all(a[r] == [' ' for _ in range(columns)]):
-                a = a[:r]
-        return a
+            buf[i:i + len(line)] = line
+            i += len(line)
+        written = numpy.flatnonzero(numpy.any(a != ' ', axis=1))
+        return a[:written[-1] + 1] if len(written) else a[:0]
 
     def cleanup(self):
         self.out_stream.write(terminalcontrol.SCROLL_DOWN)
-        rows, _ = self.tc.get_screen_position()
+        rows, _ = self.tc.get_cursor_position()
         for i in range(1000):
             self.tc.erase_line()
             self.tc.down()
@@ -165,6 +190,12 @@ class Terminal(object):
         os.system('stty '+self.original_stty)
         self.tc.erase_rest_of_line()
 
+def row_text(line):
+    """The characters of a row of an array as a string"""
+    if line.dtype.char == 'S' and line.dtype.itemsize == 1:
+        return line.tostring()
+    return ''.join(line)
+
 def test():
     with Terminal(sys.stdin, sys.stdout) as t:
         rows, columns = t.tc.get_screen_size()
@@ -0,0 +1,147 @@
+"""Running the user's code on a thread of its own, so the repl can keep
+reading keys and painting while it runs"""
+
+import sys
+import ctypes
+import signal
+import threading
+from Queue import Queue
+
+# sent to the thread running code on ctrl-c, to cut short whatever system
+# call it's blocked in
+WAKE_SIGNAL = signal.SIGUSR1
+
+def set_async_exc(ident, exc):
+    """Has exc raised in thread ident the next time it runs some Python,
+    or if exc is None, takes back one that hasn't been raised yet"""
+    set_exc = ctypes.pythonapi.PyThreadState_SetAsyncExc
+    if set_exc(ctypes.c_long(ident), ctypes.py_object(exc) if exc else None) > 1:
+        # never happens unless the thread id was wrong: undo it
+        set_exc(ctypes.c_long(ident), None)
+
+class CodeRunner(object):
+    """Runs source in an interpreter, always on the same thread of its own,
+    so thread-local state like the decimal context lasts from one line to
+    the next
+
+    Python can't stop a thread, but it can raise an exception in one the
+    next time that thread runs some Python, which is how code is
+    interrupted: a loop is stopped straight away. A call blocked in C is
+    sent WAKE_SIGNAL first, which cuts short the system call it's waiting
+    in, like sleep or a read, so it returns to Python.
+
+    >>> import code
+    >>> r = CodeRunner(code.InteractiveInterpreter())
+    >>> r.start('x = 1'); r.wait(), r.unfinished
+    (True, False)
+    >>> r.start('if x:'); r.wait(), r.unfinished
+    (True, True)
+    >>> r.close()
+    """
+    def __init__(self, interp):
+        self.interp = interp
+        self.thread = None
+        self.sources = None
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        self.finished.set()
+        self.done = True # not running the source, so can't be interrupted
+        self.unfinished = False # whether the source was incomplete
+        self.exit = None # the SystemExit the code raised, if it did
+        self.check_interval = None # to go back to once an interrupt's done
+        try:
+            # a Python handler, even one doing nothing, makes the signal
+            # interrupt system calls rather than kill the process
+            signal.signal(WAKE_SIGNAL, lambda signum, frame: None)
+        except ValueError:
+            pass # not on the main thread, so blocked calls wait it out
+
+    def start(self, source):
+        if self.thread is None or not self.thread.is_alive():
+            # the first time, or in a checkpoint, which forking left with
+            # only the thread that forked: the locks the old thread may
+            # have held then, even finished's, would never be let go of
+            self.lock = threading.Lock()
+            self.finished = threading.Event()
+            self.sources = Queue()
+            self.thread = threading.Thread(target=self.run, args=(self.sources,))
+            self.thread.daemon = True
+            self.thread.start()
+        else:
+            self.finished.clear()
+        self.unfinished = False
+        self.exit = None
+        self.sources.put(source)
+
+    def run(self, sources):
+        while True:
+            source = sources.get()
+            if source is None:
+                return
+            try:
+                try:
+                    with self.lock:
+                        self.done = False
+                    self.unfinished = self.interp.runsource(source)
+                finally:
+                    self.stop_interrupts()
+            except SystemExit as e:
+                self.exit = e
+            except KeyboardInterrupt:
+                # interrupted while compiling, or just as the code finished
+                self.interp.showtraceback()
+            self.finished.set()
+
+    def stop_interrupts(self):
+        """Marks the code done, so that no more interrupts are sent, and
+        takes back one that was sent but hasn't been raised yet"""
+        while True:
+            try:
+                with self.lock:
+                    self.done = True
+                    set_async_exc(self.thread.ident, None)
+                    if self.check_interval is not None:
+                        sys.setcheckinterval(self.check_interval)
+                        self.check_interval = None
+                return
+            except KeyboardInterrupt:
+                pass # raised before it could be taken back: too late to show
+
+    def close(self):
+        """Has the thread end once it's run what it's been given"""
+        if self.thread is not None and self.thread.is_alive():
+            self.sources.put(None)
+            if not self.running:
+                # or it can be torn down with the interpreter, mid get
+                self.thread.join()
+            self.thread = None
+
+    @property
+    def running(self):
+        return not self.finished.is_set()
+
+    def wait(self, timeout=None):
+        """Blocks until the code is done, returning whether it is"""
+        self.finished.wait(timeout)
+        return self.finished.is_set()
+
+    def interrupt(self):
+        """Raises KeyboardInterrupt in the running code"""
+        with self.lock:
+            if self.done:
+                return
+            set_async_exc(self.thread.ident, KeyboardInterrupt)
+            # it's raised when the thread next checks, which is usually only
+            # every hundred instructions: code that woke from a blocked call
+            # could be done before then, and it'd be taken back unraised
+            if self.check_interval is None:
+                self.check_interval = sys.getcheckinterval()
+                sys.setcheckinterval(1)
+            try:
+                pthread_kill = ctypes.CDLL(None).pthread_kill
+            except AttributeError:
+                return
+            pthread_kill(ctypes.c_ulong(self.thread.ident), WAKE_SIGNAL)
+
+if __name__ == '__main__':
+    import doctest; doctest.testmod()
@@ -0,0 +1,104 @@
+"""Completion that remembers what it found until the namespace changes
+
+Typing another character of a word only narrows the matches found for the
+word so far, rather than scanning the namespace, builtins or an object's
+attributes again.
+"""
+
+import __builtin__
+import keyword
+import rlcompleter
+
+from bpython.autocomplete import Autocomplete, has_abc
+if has_abc:
+    import abc
+
+class CompletionCache(object):
+    """Matches found for each prefix of each word, for one version of the
+    namespace
+
+    Each completer is made for one version, and only uses the cache while
+    it's current, so a completion that was running when the namespace
+    changed doesn't mix its results into the new ones."""
+    def __init__(self):
+        self.version = 0
+        self.names = {} # prefix -> [(name, match)] of globals and builtins
+        self.attributes = {} # id(obj) -> (obj, {prefix -> [attribute name]}),
+                             # obj kept so its id can't be reused
+
+    def bump(self):
+        """Forgets everything; called whenever code might have changed the namespace"""
+        self.version += 1
+        self.names = {}
+        self.attributes = {}
+
+def narrowest(found, prefix):
+    """What was found for the longest cached prefix of prefix, or None"""
+    for end in range(len(prefix), -1, -1):
+        if prefix[:end] in found:
+            return found[prefix[:end]]
+    return None
+
+class CachingAutocomplete(Autocomplete):
+    """Autocomplete that narrows the matches it found for a shorter prefix,
+    for as long as the namespace is the version it was made for"""
+    def __init__(self, namespace, config, cache):
+        Autocomplete.__init__(self, namespace, config)
+        self.cache = cache
+        self.version = cache.version
+
+    def found(self, kind):
+        """The cache's dictionary of kind ('names' or 'attributes'), or a
+        throwaway one if the namespace has changed since this was made"""
+        if self.cache.version != self.version:
+            return {}
+        return getattr(self.cache, kind)
+
+    def global_matches(self, text):
+        found = self.found('names')
+        pairs = narrowest(found, text)
+        if pairs is None:
+            pairs = self.global_pairs(text)
+        else:
+            pairs = [(word, match) for word, match in pairs
+                     if self.method_match(word, len(text), text)]
+        found[text] = pairs
+        return [match for _, match in pairs]
+
+    def global_pairs(self, text):
+        """(name, match) of every keyword, builtin and global matching text,
+        sorted by match as Autocomplete.global_matches sorts them"""
+        words = {}
+        n = len(text)
+        for word in keyword.kwlist:
+            if self.method_match(word, n, text):
+                words[word] = word
+        for nspace in [__builtin__.__dict__, self.namespace]:
+            for word, val in nspace.items():
+                if self.method_match(word, n, text) and word != "__builtins__":
+                    words[self._callable_postfix(val, word)] = word
+        return sorted(((word, match) for match, word in words.items()),
+                      key=lambda pair: pair[1])
+
+    def attr_lookup(self, obj, expr, attr):
+        _, found = self.found('attributes').setdefault(id(obj), (obj, {}))
+        words = narrowest(found, attr)
+        if words is None:
+            words = self.attribute_names(obj)
+        words = found[attr] = [word for word in words
+                               if self.method_match(word, len(attr), attr) and
+                                  word != "__builtins__"]
+        return ["%s.%s" % (expr, word) for word in words]
+
+    def attribute_names(self, obj):
+        """Every attribute name of obj, as Autocomplete.attr_lookup finds them"""
+        words = dir(obj)
+        if hasattr(obj, '__class__'):
+            words.append('__class__')
+            words = words + rlcompleter.get_class_members(obj.__class__)
+            if has_abc and not isinstance(obj.__class__, abc.ABCMeta):
+                try:
+                    words.remove('__abstractmethods__')
+                except ValueError:
+                    pass
+        return words
@@ -0,0 +1,285 @@
+"""Models of the lines the repl displays
+
+Painting only ever needs the few lines at the bottom of the history, so
+these let it look at them without building a list of everything.
+"""
+
+from collections import deque, OrderedDict
+
+class LinesView(object):
+    """Read-only sequence of the items of several sequences, end to end
+
+    >>> v = LinesView(['a', 'b'], [], ['c'])
+    >>> len(v), v[2], v[-1], v[1:], v[-2:]
+    (3, 'c', 'c', ['b', 'c'], ['b', 'c'])
+    """
+    def __init__(self, *parts):
+        self.parts = parts
+
+    def __len__(self):
+        return sum(len(part) for part in self.parts)
+
+    def __iter__(self):
+        for part in self.parts:
+            for line in part:
+                yield line
+
+    def __getitem__(self, index):
+        length = len(self)
+        if isinstance(index, slice):
+            start, stop, step = index.indices(length)
+            if step != 1:
+                raise ValueError("LinesView slices can't have a step")
+            lines = []
+            offset = 0
+            for part in self.parts:
+                if start < offset + len(part) and stop > offset:
+                    lines.extend(part[max(0, start - offset):stop - offset])
+                offset += len(part)
+            return lines
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError('LinesView index out of range')
+        for part in self.parts:
+            if index < len(part):
+                return part[index]
+            index -= len(part)
+
+WRAP_CACHE_SIZE = 2000 # wrapped lines kept at each width, and at the older
+                       # widths put together
+WRAP_CACHE_WIDTHS = 16 # widths lines are kept wrapped to, so that resizing
+                       # back and forth doesn't wrap them all again
+LONG_LINE_ROWS = 100 # lines wrapping to more rows are only wrapped a bit at a time
+
+def rows_needed(length, width):
+    """How many rows of width a line of length wraps to (empty lines take none)"""
+    return -(-length // width)
+
+class Scrollback(object):
+    """Ring buffer of logical lines of output, wrapped lazily to width
+
+    Holds at most max_lines lines and max_bytes bytes of them, dropping the
+    oldest when over. Its length and items are display rows at the current
+    width; only the rows asked for are ever wrapped, so changing width
+    costs nothing until those rows are looked at. wrap has to cut lines
+    into rows of width characters, so the rows of part of a long line can
+    be had by wrapping just that part.
+
+    >>> s = Scrollback(lambda line, width: [line[i:i+width] for i in range(0, len(line), width)], max_lines=3)
+    >>> s.width = 2
+    >>> s.extend(['a', 'bbb', 'c', 'dd'])
+    >>> len(s), s[0], s[-3:], s.take_evicted(), s.take_evicted()
+    (4, 'bb', ['b', 'c', 'dd'], 1, 0)
+    >>> s.width = 10
+    >>> len(s), s[0:3]
+    (3, ['bbb', 'c', 'dd'])
+    """
+    def __init__(self, wrap, max_lines=0, max_bytes=0):
+        self.wrap = wrap # function of (line, width) -> list of rows
+        self.max_lines = max_lines # 0 for no limit
+        self.max_bytes = max_bytes # 0 for no limit
+        self.width = None
+        self.lines = deque()
+        self.lengths = deque()
+        self.sizes = deque()
+        self.first = 0 # sequence number of self.lines[0]
+        self.bytes = 0
+        self.row_counts = {} # width -> total rows at that width
+        self.wrapped = OrderedDict() # width -> {sequence number: rows}, oldest first
+        self.evicted = 0 # rows dropped since the last take_evicted()
+
+    def append(self, line):
+        length, size = len(line), len(str(line))
+        self.lines.append(line)
+        self.lengths.append(length)
+        self.sizes.append(size)
+        self.bytes += size
+        for width in self.row_counts:
+            self.row_counts[width] += rows_needed(length, width)
+        while ((self.max_lines and len(self.lines) > self.max_lines) or
+               (self.max_bytes and self.bytes > self.max_bytes and len(self.lines) > 1)):
+            self.evict()
+
+    def evict(self):
+        self.lines.popleft()
+        length = self.lengths.popleft()
+        self.bytes -= self.sizes.popleft()
+        for width in self.row_counts:
+            self.row_counts[width] -= rows_needed(length, width)
+        self.forget_wrapped(self.first)
+        self.first += 1
+        self.evicted += rows_needed(length, self.width) if self.width else 1
+
+    def forget_wrapped(self, seq):
+        """Drops line seq's rows from the wrap cache, at every width"""
+        for rows in self.wrapped.itervalues():
+            rows.pop(seq, None)
+
+    def extend(self, lines):
+        for line in lines:
+            self.append(line)
+
+    def pop(self):
+        """Removes and returns the last line"""
+        line = self.lines.pop()
+        length = self.lengths.pop()
+        self.bytes -= self.sizes.pop()
+        for width in self.row_counts:
+            self.row_counts[width] -= rows_needed(length, width)
+        self.forget_wrapped(self.first + len(self.lines))
+        return line
+
+    def last_seq(self):
+        """Sequence number of the last line, which unlike its index doesn't
+        change as lines are dropped from the front"""
+        return self.first + len(self.lines) - 1
+
+    def replace(self, seq, lines):
+        """Replaces the line with sequence number seq with lines, returning
+        whether it hadn't been dropped yet"""
+        i = seq - self.first
+        if not 0 <= i < len(self.lines):
+            return False
+        after = [self.pop() for _ in range(len(self.lines) - i - 1)]
+        self.pop()
+        self.extend(lines)
+        self.extend(reversed(after))
+        return True
+
+    def clear(self):
+        self.lines.clear()
+        self.lengths.clear()
+        self.sizes.clear()
+        self.bytes = 0
+        self.first = 0
+        self.row_counts = {}
+        self.wrapped = OrderedDict()
+
+    def take_evicted(self):
+        """Returns how many rows have been dropped since the last call"""
+        evicted, self.evicted = self.evicted, 0
+        return evicted
+
+    def rows_for(self, i, start, stop):
+        """Rows start to stop of those line i wraps to at the current width"""
+        if rows_needed(self.lengths[i], self.width) > LONG_LINE_ROWS:
+            return self.wrap(self.lines[i][start * self.width:stop * self.width], self.width)
+        cache = self.wrapped.get(self.width)
+        if cache is None:
+            while self.wrapped and (len(self.wrapped) >= WRAP_CACHE_WIDTHS or
+                                    sum(map(len, self.wrapped.itervalues())) > WRAP_CACHE_SIZE):
+                self.wrapped.popitem(last=False)
+            cache = self.wrapped[self.width] = {}
+        rows = cache.get(self.first + i)
+        if rows is None:
+            if len(cache) >= WRAP_CACHE_SIZE:
+                cache.clear()
+            rows = cache[self.first + i] = self.wrap(self.lines[i], self.width)
+        return rows[start:stop]
+
+    def __len__(self):
+        if self.width not in self.row_counts:
+            if len(self.row_counts) > 3:
+                self.row_counts = {}
+            self.row_counts[self.width] = sum(rows_needed(length, self.width)
+                                              for length in self.lengths)
+        return self.row_counts[self.width]
+
+    def __iter__(self):
+        for i in range(len(self.lines)):
+            for row in self.rows_for(i, 0, rows_needed(self.lengths[i], self.width)):
+                yield row
+
+    def __getitem__(self, index):
+        total = len(self)
+        if not isinstance(index, slice):
+            if index < 0:
+                index += total
+            if not 0 <= index < total:
+                raise IndexError('Scrollback index out of range')
+            return self[index:index+1][0]
+        start, stop, step = index.indices(total)
+        if step != 1:
+            raise ValueError("Scrollback slices can't have a step")
+        if start >= stop:
+            return []
+        # painting looks at the end, so find the first line by walking back
+        i, row = len(self.lines), total
+        while row > start:
+            i -= 1
+            row -= rows_needed(self.lengths[i], self.width)
+        rows = []
+        while row < stop and i < len(self.lines):
+            line_rows = rows_needed(self.lengths[i], self.width)
+            rows.extend(self.rows_for(i, max(0, start - row), min(line_rows, stop - row)))
+            row += line_rows
+            i += 1
+        return rows
+
+class CollapsedOutput(object):
+    """Lines of output held back from the scrollback, and the sequence
+    number of the line standing in for them there
+
+    Only the newest max_lines lines and max_bytes bytes of them are kept,
+    as the scrollback would, with a count of those dropped.
+
+    >>> c = CollapsedOutput(max_lines=2)
+    >>> c.extend(['a', 'b', 'c']); list(c.lines), c.dropped, c.total()
+    (['b', 'c'], 1, 3)
+    >>> c = CollapsedOutput(max_lines=3, max_bytes=4)
+    >>> c.extend(['a', 'bb', 'c', 'dd']); list(c.lines), c.dropped
+    (['c', 'dd'], 2)
+    """
+    def __init__(self, max_lines=0, max_bytes=0):
+        self.max_lines = max_lines # 0 for no limit
+        self.max_bytes = max_bytes # 0 for no limit
+        # with no byte limit, lines drops the oldest by itself
+        self.lines = deque(maxlen=None if max_bytes else max_lines or None)
+        self.sizes = deque()
+        self.bytes = 0
+        self.dropped = 0 # oldest lines let go of to keep under the limits
+        self.seq = None
+
+    def extend(self, lines):
+        if not self.max_bytes:
+            total = len(self.lines) + len(lines)
+            self.lines.extend(lines)
+            self.dropped += total - len(self.lines)
+            return
+        for line in lines:
+            size = len(str(line))
+            self.lines.append(line)
+            self.sizes.append(size)
+            self.bytes += size
+        while ((self.max_lines and len(self.lines) > self.max_lines) or
+               (self.max_bytes and self.bytes > self.max_bytes and len(self.lines) > 1)):
+            self.lines.popleft()
+            self.bytes -= self.sizes.popleft()
+            self.dropped += 1
+
+    def total(self):
+        """How many lines were collapsed, dropped ones included"""
+        return len(self.lines) + self.dropped
+
+class WrapCache(object):
+    """Remembers how each line of a list was last wrapped
+
+    Lines are only rewrapped when what they'd display (the prompt, the
+    line and the width) changes."""
+    def __init__(self, wrap):
+        self.wrap = wrap # function of (line, width) -> list of lines
+        self.cache = {} # index -> (key, wrapped lines)
+
+    def wrapped(self, index, prompt, line, width):
+        key = (prompt, str(line), width)
+        cached = self.cache.get(index)
+        if cached is None or cached[0] != key:
+            cached = self.cache[index] = (key, self.wrap(prompt + line, width))
+        return cached[1]
+
+    def clear(self):
+        self.cache = {}
+
+if __name__ == '__main__':
+    import doctest; doctest.testmod()
@@ -18,3 +18,10 @@ class Keypress(Event):
         self.name = name
     def __repr__(self, seq):
         return "<Key %r>" % self.seq
+
+class PasteEvent(Event):
+    """Text that arrived all at once in a bracketed paste"""
+    def __init__(self, text):
+        self.text = text
+    def __repr__(self):
+        return "<PasteEvent %r>" % self.text
@@ -0,0 +1,183 @@
+"""Syntax highlighting that only redoes the work for what changed
+
+Lexing and formatting a line used to be done from scratch after every
+keystroke; here the tokens and formatted strings of recent lines are kept,
+and source that's only been added to (or backspaced) at the end is re-lexed
+from the last point the lexer is known to have been in its root state.
+"""
+
+import copy
+import threading
+from collections import OrderedDict
+
+from pygments import format
+from pygments.token import Token
+from bpython._py3compat import PythonLexer
+from bpython.repl import split_lines
+from fmtstr.fmtstr import FmtStr
+from fmtstr.bpythonparse import parse as bpythonparse
+
+HIGHLIGHT_CACHE_SIZE = 1000 # lines kept of both tokens and formatted strings
+
+class LRUCache(object):
+    """Dictionary that forgets the least recently used keys past size,
+    locked so that background completion can share it
+
+    >>> c = LRUCache(2)
+    >>> c['a'] = 1; c['b'] = 2; c.get('a'); c['c'] = 3
+    1
+    >>> sorted(c.cache.keys())
+    ['a', 'c']
+    """
+    def __init__(self, size):
+        self.size = size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.cache.pop(key)
+            except KeyError:
+                return default
+            self.cache[key] = value
+            return value
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.cache.pop(key, None)
+            self.cache[key] = value
+            while len(self.cache) > self.size:
+                self.cache.popitem(last=False)
+
+    def __len__(self):
+        return len(self.cache)
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+def restart_safe(token, value):
+    """Whether the lexer is in its root state, with nothing on its stack,
+    both before and after producing this token
+
+    Punctuation and (apart from commas in import statements) operators are
+    only produced by rules of the root state that don't push a new one."""
+    return token is Token.Punctuation or (token is Token.Operator and value != ',')
+
+class IncrementalLexer(object):
+    """Lexes python source like PythonLexer().get_tokens(source), reusing
+    the tokens of the last source it lexed when it's a prefix of this one
+    or this one's a prefix of it
+
+    >>> lexer = IncrementalLexer()
+    >>> _ = lexer.lex('x = foo(1, 2)')
+    >>> lexer.lex('x = foo(1, 2) + "a') == list(PythonLexer().get_tokens('x = foo(1, 2) + "a'))
+    True
+    >>> lexer.relexed
+    7
+    """
+    def __init__(self):
+        self.lexer = PythonLexer()
+        self.text = u'' # the last source, preprocessed as get_tokens does it
+        self.tokens = [] # (position, token, value) of self.text
+        self.relexed = 0 # characters lexed for the last source
+        self.lock = threading.Lock() # text and tokens change together
+
+    def prepare(self, source):
+        """Preprocesses source as PythonLexer().get_tokens would"""
+        if not isinstance(source, unicode):
+            source = source.decode(self.lexer.encoding)
+        text = source.replace('\r\n', '\n').replace('\r', '\n').strip('\n')
+        return text + '\n'
+
+    def lex(self, source):
+        text = self.prepare(source)
+        with self.lock:
+            return self.lex_prepared(text)
+
+    def lex_prepared(self, text):
+        # the old text's tokens up to a character both texts share (not the
+        # newline get_tokens appends) are still right, except that a
+        # backtick would let a later token reach back over them
+        common = min(len(text), len(self.text)) - 1
+        start = i = 0
+        if '`' not in text and text.startswith(self.text[:common]):
+            i = len(self.tokens)
+            while i > 0:
+                i -= 1
+                pos, token, value = self.tokens[i]
+                if pos + len(value) <= common and restart_safe(token, value):
+                    start = pos
+                    break
+            else:
+                i = 0
+        tokens = self.tokens[:i]
+        tokens.extend((start + pos, token, value)
+                      for pos, token, value in self.lexer.get_tokens_unprocessed(text[start:]))
+        self.text, self.tokens, self.relexed = text, tokens, len(text) - start
+        return [(token, value) for _, token, value in tokens]
+
+def line_tokens(all_tokens, lineno):
+    """The tokens of line lineno of lexed source if it's the last line, else []
+
+    Trims the lexed tokens the way bpython.repl.Repl.tokenize does."""
+    all_tokens = list(all_tokens)
+    while all_tokens and not all_tokens[-1][1]:
+        all_tokens.pop()
+    if not all_tokens:
+        return []
+    all_tokens[-1] = (all_tokens[-1][0], all_tokens[-1][1].rstrip('\n'))
+    line = 0
+    tokens = []
+    for token, value in split_lines(all_tokens):
+        if token is Token.Text and value == '\n':
+            line += 1
+            tokens = []
+            continue
+        tokens.append((token, value))
+    return tokens if line == lineno else []
+
+class Highlighter(object):
+    """Tokens and formatted strings of lines of python, remembering both for
+    recently seen lines"""
+    def __init__(self, formatter, size=HIGHLIGHT_CACHE_SIZE):
+        self.formatter = formatter
+        self.lexer = IncrementalLexer()
+        self.tokens = LRUCache(size) # (source, last line number) -> tokens
+        self.formatted = LRUCache(size) # tuple of tokens -> FmtStr
+
+    def copy(self):
+        """A Highlighter sharing this one's caches, with a lexer of its own
+        for another thread to use"""
+        highlighter = copy.copy(self)
+        highlighter.lexer = IncrementalLexer()
+        return highlighter
+
+    def locks(self):
+        """The locks of the caches copies share"""
+        return [self.tokens.lock, self.formatted.lock]
+
+    def line_tokens(self, source, lineno):
+        """Tokens of the last line of source, as Repl.tokenize would return
+        them if no parens were highlighted"""
+        key = (source, lineno)
+        tokens = self.tokens.get(key)
+        if tokens is None:
+            tokens = self.tokens[key] = line_tokens(self.lexer.lex(source), lineno)
+        return list(tokens)
+
+    def format(self, tokens):
+        """FmtStr of tokens (a copy, so callers can assign into it)"""
+        key = tuple(tokens)
+        formatted = self.formatted.get(key)
+        if formatted is None:
+            formatted = self.formatted[key] = bpythonparse(format(tokens, self.formatter))
+        return FmtStr(*formatted.basefmtstrs)
+
+    def clear(self):
+        self.tokens.clear()
+        self.formatted.clear()
+
+if __name__ == '__main__':
+    import doctest; doctest.testmod()
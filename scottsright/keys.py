@@ -0,0 +1,137 @@
+"""Splitting raw terminal input into key sequences
+
+Known sequences are kept in a trie so the longest one at the front of the
+input can be found without guessing from lengths and prefixes; unknown
+escape sequences still get grouped by the generic CSI grammar.
+"""
+
+import events
+from manual_readline import char_sequences as rl_char_sequences
+from history import CHAR_SEQUENCES as history_char_sequences
+
+ESC = '\x1b'
+PASTE_START = '\x1b[200~'
+PASTE_END = '\x1b[201~'
+_END = None # trie key marking the end of a complete sequence
+
+# Sequences terminals commonly send for special keys, including the arrows
+# and shift-tab that Repl.process_event handles itself
+TERMINAL_SEQUENCES = (
+    ['\x1b[%s' % c for c in 'ABCDHFZ'] +             # arrows, home, end, shift-tab
+    ['\x1bO%s' % c for c in 'ABCDHFPQRS'] +          # application mode arrows, F1-F4
+    ['\x1b[%d~' % n for n in (1, 2, 3, 4, 5, 6, 7, 8,
+                              15, 17, 18, 19, 20, 21, 23, 24)] +
+    ['\x1b[1;%d%s' % (mod, c) for mod in (2, 3, 5) for c in 'ABCD'] # shift/alt/ctrl arrows
+    )
+
+
+class Trie(object):
+    """Prefix tree of key sequences
+
+    >>> t = Trie(['\\x1b[A', '\\x1b[3~'])
+    >>> t.longest_match('\\x1b[Ab', 0)
+    (3, False)
+    >>> t.longest_match('\\x1b[3', 0)
+    (0, True)
+    """
+    def __init__(self, sequences=()):
+        self.root = {}
+        for seq in sequences:
+            self.add(seq)
+
+    def add(self, seq):
+        node = self.root
+        for c in seq:
+            node = node.setdefault(c, {})
+        node[_END] = True
+
+    def __contains__(self, seq):
+        node = self.root
+        for c in seq:
+            if c not in node:
+                return False
+            node = node[c]
+        return _END in node
+
+    def longest_match(self, data, start):
+        """Returns (length of longest known sequence at data[start:], whether
+        more input could extend the match)"""
+        node = self.root
+        longest = 0
+        i = start
+        while i < len(data) and data[i] in node:
+            node = node[data[i]]
+            i += 1
+            if _END in node:
+                longest = i - start
+        could_continue = i == len(data) and any(k is not _END for k in node)
+        return longest, could_continue
+
+def default_trie():
+    """Returns a trie of every sequence scottsright binds or knows about"""
+    return Trie(TERMINAL_SEQUENCES +
+                list(rl_char_sequences) +
+                list(history_char_sequences))
+
+def generic_sequence_length(data, start):
+    """Length of the escape sequence at data[start:] by CSI grammar, or None
+    if it's incomplete"""
+    if start + 1 >= len(data):
+        return None
+    if data[start + 1] != '[':
+        return 2 # alt/meta + key
+    i = start + 2
+    while i < len(data) and '\x20' <= data[i] <= '\x3f': # parameters, intermediates
+        i += 1
+    if i == len(data):
+        return None
+    return i + 1 - start
+
+def decode(data, trie, final=False):
+    r"""Splits data into key sequences and paste events
+
+    Returns (sequences, rest), rest being an escape sequence or unfinished
+    bracketed paste at the end of data that more input might complete. If
+    final, rest is always empty, an incomplete sequence is reported starting
+    with a bare escape and an unfinished paste with what's arrived of it.
+
+    >>> decode('ab\x1b[Ac\x1b[', default_trie())
+    (['a', 'b', '\x1b[A', 'c'], '\x1b[')
+    >>> decode('\x1b', default_trie(), final=True)
+    (['\x1b'], '')
+    >>> decode('a\x1b[200~b\x1b[A\x1b[201~', default_trie())
+    (['a', <PasteEvent 'b\x1b[A'>], '')
+    """
+    sequences = []
+    i = 0
+    while i < len(data):
+        esc = data.find(ESC, i)
+        if esc == -1:
+            sequences.extend(data[i:])
+            break
+        sequences.extend(data[i:esc])
+        i = esc
+        if data.startswith(PASTE_START, i):
+            end = data.find(PASTE_END, i)
+            if end == -1:
+                if not final:
+                    return sequences, data[i:]
+                end = len(data)
+            sequences.append(events.PasteEvent(data[i+len(PASTE_START):end]))
+            i = end + len(PASTE_END)
+            continue
+        length, could_continue = trie.longest_match(data, i)
+        if could_continue and not final:
+            return sequences, data[i:]
+        if not length:
+            length = generic_sequence_length(data, i)
+            if length is None:
+                if not final:
+                    return sequences, data[i:]
+                length = 1
+        sequences.append(data[i:i+length])
+        i += length
+    return sequences, ''
+
+if __name__ == '__main__':
+    import doctest; doctest.testmod()
@@ -1,23 +1,108 @@
+import time
+import logging
+import optparse
+from collections import deque
+
 from scottsright.terminal import Terminal
-from scottsright.repl import Repl
 from scottsright.terminalcontrol import TerminalController
+from scottsright import events
+
+POLL_INTERVAL = .01 # seconds between checks on running code and completion
+FIRST_PROMPT = '>>> '
+
+def paint(repl, term, frame, about_to_exit=False):
+    _, cursor_pos = repl.paint(about_to_exit=about_to_exit, frame=frame)
+    scrolled = term.render_to_terminal(frame, cursor_pos)
+    repl.scroll_offset += scrolled
+
+def save_terminal(term, tc):
+    """What a checkpoint being resumed needs to carry on drawing, and
+    reading input, where this process leaves off"""
+    return term.top_usable_row, tc.in_buffer, list(tc.pending_events)
+
+def restore_terminal(term, tc, state):
+    term.top_usable_row, tc.in_buffer, pending_events = state
+    tc.pending_events = deque(pending_events)
+    tc.screen_size = None # the window may have been resized since the fork
+    term.invalidate()
+
+def ctrl_c_pressed(tc):
+    """Whether ctrl-c is among the keys ready to be read, leaving the
+    rest of them to be read as usual"""
+    ready = []
+    e = tc.next_event(timeout=0)
+    while e is not None:
+        ready.append(e)
+        if e == '':
+            break # end of input, which would be read again and again
+        e = tc.next_event(timeout=0)
+    pressed = '\x03' in ready
+    if pressed:
+        if tc.recording is not None:
+            tc.recording.record('\x03')
+        ready = [e for e in ready if e != '\x03']
+    tc.pending_events.extendleft(reversed(ready))
+    return pressed
 
 def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--record', metavar='FILE',
+                      help='write the events of the session to FILE, '
+                           'for python -m scottsright.replay to replay')
+    options, _ = parser.parse_args()
+    logging.basicConfig(filename='terminal.log', level=logging.DEBUG)
     with TerminalController() as tc:
         with Terminal(tc) as term:
+            # show a prompt straight away: the repl, and the bpython and
+            # pygments machinery it highlights and completes with, take
+            # longer to import than everything else put together
+            rows, columns = tc.get_screen_size()
+            if options.record:
+                from scottsright.replay import Recorder
+                tc.recording = Recorder(open(options.record, 'w'))
+                tc.recording.record(events.WindowChangeEvent(rows, columns))
+            scrolled = term.render_to_terminal([FIRST_PROMPT], (0, len(FIRST_PROMPT)))
+            from scottsright.repl import Repl
+            from scottsright.cellframe import CellFrame # and numpy with it
             with Repl() as repl:
-                rows, columns = tc.get_screen_size()
                 repl.width = columns
                 repl.height = rows
+                repl.scroll_offset += scrolled
+                repl.enable_checkpoints(lambda: save_terminal(term, tc),
+                                        lambda state: restore_terminal(term, tc, state))
+                repl.run_in_background = True
+                repl.interrupted = lambda: ctrl_c_pressed(tc)
+                frame = CellFrame(columns) # painted into again for every frame
+                paint(repl, term, frame)
+                min_paint_interval = 1.0 / repl.config.max_fps
+                last_paint = time.time()
+                changed = False
                 while True:
+                    # apply every event that's ready before painting, but
+                    # keep painting now and then while input keeps coming;
+                    # while code or completion runs, wake up to show what
+                    # they've come up with, no faster than max_fps
+                    busy = repl.running or repl.completion_worker.busy
+                    e = tc.get_event(timeout=POLL_INTERVAL if busy else None)
                     try:
-                        repl.process_event(tc.get_event())
+                        while e is not None:
+                            repl.process_event(e)
+                            changed = True
+                            if time.time() - last_paint > min_paint_interval:
+                                paint(repl, term, frame)
+                                last_paint = time.time()
+                                changed = False
+                            e = tc.get_event(timeout=0)
+                        changed = repl.update_running() or changed
                     except SystemExit:
-                        array, cursor_pos = repl.paint(about_to_exit=True)
-                        term.render_to_terminal(array, cursor_pos)
+                        paint(repl, term, frame, about_to_exit=True)
                         raise
-                    else:
-                        array, cursor_pos = repl.paint()
-                        scrolled = term.render_to_terminal(array, cursor_pos)
-                        repl.scroll_offset += scrolled
-main()
+                    changed = repl.update_completion() or changed
+                    if changed and (not repl.running or
+                                    time.time() - last_paint > min_paint_interval):
+                        paint(repl, term, frame)
+                        last_paint = time.time()
+                        changed = False
+
+if __name__ == '__main__':
+    main()
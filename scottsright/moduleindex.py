@@ -0,0 +1,121 @@
+"""An index of importable modules, saved between runs for import completion
+
+bpython finds modules by walking all of sys.path on every launch, which
+can take seconds in a big virtualenv. The index remembers the modules found
+in each sys.path entry along with the mtimes of the directories they were
+found in, so only entries where one of those has changed are walked again.
+"""
+
+import os
+import sys
+import json
+import logging
+import tempfile
+
+from bpython import importcompletion
+
+INDEX_FORMAT = 1 # bump when what's saved changes
+
+def mtime(path):
+    """The mtime of path, or None if it can't be found"""
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+def scan_entry(path):
+    """Returns (modules in sys.path entry path, {directory: mtime} of the
+    directories they were found in)"""
+    modules = []
+    for module in importcompletion.find_modules(path):
+        if not isinstance(module, unicode):
+            try:
+                module = module.decode(sys.getfilesystemencoding())
+            except UnicodeDecodeError:
+                continue # not importable anyway
+        modules.append(module)
+    dirs = {path: mtime(path)}
+    for module in modules:
+        d = os.path.join(path, *module.split('.'))
+        if os.path.isdir(d):
+            dirs[d] = mtime(d)
+    return modules, dirs
+
+class ModuleIndex(object):
+    """Modules in each sys.path entry, kept in a file at filename
+
+    Entries are keyed by absolute path; each holds the modules found there
+    and the mtimes of the directories they were found in."""
+    def __init__(self, filename, path=None):
+        self.filename = os.path.expanduser(filename) if filename else None
+        self.path = [os.path.abspath(p or os.curdir)
+                     for p in (sys.path if path is None else path)]
+        self.entries = {} # path -> {'modules': [module], 'dirs': {dir: mtime}}
+
+    def load(self):
+        """Reads the saved index, returning whether there was one for this
+        version of python"""
+        if not self.filename:
+            return False
+        try:
+            with open(self.filename) as f:
+                saved = json.load(f)
+        except (IOError, ValueError):
+            return False
+        if saved.get('format') != INDEX_FORMAT or saved.get('python') != sys.version:
+            return False
+        self.entries = saved['entries']
+        return True
+
+    def save(self):
+        if not self.filename:
+            return
+        directory = os.path.dirname(self.filename)
+        tmp = None
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            # a file of its own, as other repls may be saving at the same time
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix='.modules', suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'format': INDEX_FORMAT, 'python': sys.version,
+                           'entries': self.entries}, f)
+            os.rename(tmp, self.filename) # so a half written index is never read
+        except (IOError, OSError):
+            logging.exception('saving module index to %r failed', self.filename)
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+
+    def stale(self):
+        """sys.path entries that have never been scanned or have changed since"""
+        return [p for p in self.path
+                if p not in self.entries or
+                   any(mtime(d) != m for d, m in self.entries[p]['dirs'].items())]
+
+    def modules(self):
+        """Every module of every entry on the path, and the builtin ones"""
+        modules = set(sys.builtin_module_names)
+        for p in self.path:
+            if p in self.entries:
+                modules.update(self.entries[p]['modules'])
+        return modules
+
+    def refresh(self):
+        """Rescans the stale entries, returning whether there were any"""
+        stale = self.stale()
+        for p in stale:
+            modules, dirs = scan_entry(p)
+            self.entries[p] = {'modules': modules, 'dirs': dirs}
+        return bool(stale)
+
+def load_import_completion(filename):
+    """Fills in bpython's import completion from the index in filename,
+    then again once entries that changed have been rescanned"""
+    index = ModuleIndex(filename)
+    if index.load():
+        # replaced rather than updated so completion never sees it change size
+        importcompletion.modules = index.modules()
+    if index.refresh():
+        importcompletion.modules = index.modules()
+        index.save()
+    importcompletion.fully_loaded = True
@@ -0,0 +1,66 @@
+"""Paging through output too long to be shown in the scrollback"""
+
+from fmtstr.fmtstr import fmtstr
+
+from displaylines import Scrollback
+
+NEXT_PAGE = (' ', 'f', '\x1b[6~')
+PREVIOUS_PAGE = ('b', '\x1b[5~')
+NEXT_ROW = ('j', '\r', '\n', '\x1b[B')
+PREVIOUS_ROW = ('k', '\x1b[A')
+FIRST_PAGE = ('g', '\x1b[H')
+LAST_PAGE = ('G', '\x1b[F')
+EXPAND = ('e',)
+QUIT = ('q', '\x1b', '\x0f')
+
+class Pager(object):
+    """A screenful at a time of lines, wrapped only as they're shown
+
+    >>> p = Pager([str(i) for i in range(10)], lambda line, width: [line], 10)
+    >>> rows, _ = p.paint(10, 4); [row.s for row in rows[:-1]]
+    ['0', '1', '2']
+    >>> p.process_event(' '); rows, _ = p.paint(10, 4); [row.s for row in rows[:-1]]
+    ['3', '4', '5']
+    """
+    def __init__(self, lines, wrap, width, dropped=0):
+        self.rows = Scrollback(wrap)
+        self.rows.width = width
+        self.rows.extend(lines)
+        self.top = 0 # first row shown
+        self.page_height = 1 # rows shown at once, as of the last paint
+        self.dropped = dropped # lines before these that weren't kept
+
+    def process_event(self, e):
+        """Returns 'quit' or 'expand' for those keys, otherwise moves the page"""
+        if e in QUIT:
+            return 'quit'
+        if e in EXPAND:
+            return 'expand'
+        if e in NEXT_PAGE:
+            self.top += self.page_height
+        elif e in PREVIOUS_PAGE:
+            self.top -= self.page_height
+        elif e in NEXT_ROW:
+            self.top += 1
+        elif e in PREVIOUS_ROW:
+            self.top -= 1
+        elif e in FIRST_PAGE:
+            self.top = 0
+        elif e in LAST_PAGE:
+            self.top = len(self.rows)
+        self.top = max(0, min(self.top, len(self.rows) - self.page_height))
+
+    def paint(self, width, height):
+        """Returns height rows no wider than width, plus the cursor position"""
+        self.rows.width = width
+        self.page_height = max(1, height - 1)
+        self.top = max(0, min(self.top, len(self.rows) - self.page_height))
+        page = [fmtstr(row) for row in self.rows[self.top:self.top + self.page_height]]
+        status = ' rows %d-%d of %d%s  space/b: page  e: put it all in the scrollback  q: quit ' % (
+            self.top + 1, self.top + len(page), len(self.rows),
+            ' (%d lines before dropped)' % self.dropped if self.dropped else '')
+        page.extend(fmtstr('') for _ in range(self.page_height - len(page)))
+        return page + [fmtstr(status[:width], 'invert')], (len(page), min(len(status), width - 1))
+
+if __name__ == '__main__':
+    import doctest; doctest.testmod()
@@ -3,29 +3,44 @@ import os
 import re
 import logging
 import code
+import copy
+import time
 import threading
-from cStringIO import StringIO
+from collections import deque
 
 from bpython.autocomplete import Autocomplete, SUBSTRING, FUZZY, SIMPLE
-from bpython.repl import Repl as BpythonRepl
+from bpython.repl import Repl as BpythonRepl, MatchesIterator
 from bpython.config import Struct, loadini, default_config_path
 from bpython.formatter import BPythonFormatter
-from pygments import format
-from bpython import importcompletion
 
 import sitefix; sitefix.monkeypatch_quit()
 import replpainter as paint
 import events
-from fmtstr.fsarray import FSArray
 from fmtstr.fmtstr import fmtstr
-from fmtstr.bpythonparse import parse as bpythonparse
 from manual_readline import char_sequences as rl_char_sequences
 from abbreviate import substitute_abbreviations
+from displaylines import LinesView, WrapCache, Scrollback, CollapsedOutput, rows_needed
+from settings import load_settings
+from highlight import Highlighter
+from background import BackgroundWorker
+from completion import CompletionCache, CachingAutocomplete
+from moduleindex import load_import_completion
+from checkpoints import Checkpoints
+from capture import OutputCapture
+from coderunner import CodeRunner
+from pager import Pager
 
 INFOBOX_ONLY_BELOW = True
 INDENT_AMOUNT = 4
+INTERRUPT_POLL = .05 # seconds between checks for ctrl-c while replaying
 
-logging.basicConfig(level=logging.DEBUG, filename='repl.log')
+def load_config():
+    """bpython's settings from its config file, and scottsright's with them"""
+    config = Struct()
+    loadini(config, default_config_path())
+    load_settings(config, default_config_path())
+    config.autocomplete_mode = SIMPLE # only one implemented currently
+    return config
 
 class Repl(BpythonRepl):
     """
@@ -45,29 +60,56 @@ class Repl(BpythonRepl):
     (not if it's an array of the rows)
 """
 
-    def __init__(self):
+    def __init__(self, config=None):
         logging.debug("starting init")
         interp = code.InteractiveInterpreter()
-        config = Struct()
-        loadini(config, default_config_path())
-        config.autocomplete_mode = SIMPLE # only one implemented currently
+        if config is None:
+            config = load_config()
         logging.debug("starting parent init")
         super(Repl, self).__init__(interp, config)
+        self.completion_cache = CompletionCache()
+        self.completer = self.new_completer()
 
         self._current_line = ''
         self.current_formatted_line = fmtstr('')
-        self.display_lines = [] # lines separated whenever logical line
-                                # length goes over what the terminal width
-                                # was at the time of original output
+        self.display_lines = Scrollback(paint.display_linize,
+                                        config.scrollback_lines,
+                                        config.scrollback_bytes)
+                                # logical lines, wrapped to the current
+                                # terminal width when they're displayed
         self.history = [] # this is every line that's been executed;
                                 # it gets smaller on rewind
         self.display_buffer = []
+        self.display_buffer_wraps = WrapCache(paint.display_linize)
         self.formatter = BPythonFormatter(config.color_scheme)
+        self.highlighter = Highlighter(self.formatter)
         self.scroll_offset = 0
         self.cursor_offset_in_line = 0
         self.done = True
 
-        self.paste_mode = False
+        self.paste_mode = False # a paste is being added, and its lines run
+        self.paste_after = '' # see on_paste
+        self.runner = CodeRunner(self.interp)
+        self.run_in_background = False # keep handling events while code
+                                       # runs, see update_running
+        self.running = False # code is being run
+        self.errored = False # the code being run has written to stderr
+        self.pending_output = deque() # lists of lines written, yet to be shown
+        self.typeahead = deque() # events that came in while code was running
+        self.output_rows = 0 # rows of output since code was last run
+        self.collapse_limit = config.collapse_output # for the code being run
+        self.collapsing = None # CollapsedOutput of the code being run
+        self.collapsed = None # the latest CollapsedOutput, to page through
+        self.pager = None
+
+        self.checkpoints = Checkpoints(config.checkpoint_lines,
+                                       config.checkpoint_seconds,
+                                       config.checkpoints,
+                                       config.checkpoint_bytes)
+        self.save_terminal = None # see enable_checkpoints
+        self.restore_terminal = None
+        self.replaying = False
+        self.interrupted = None # see on_enter
 
         self.width = None
         self.height = None
@@ -96,29 +138,80 @@ class Repl(BpythonRepl):
         return len(self._current_line) - self.cursor_offset_in_line
     def reprint_line(self, lineno, tokens):
         logging.debug("calling reprint line with %r %r", lineno, tokens)
-        self.display_buffer[lineno] = bpythonparse(format(tokens, self.formatter))
+        self.display_buffer[lineno] = self.highlighter.format(tokens)
     def reevaluate(self):
+        """Rewinds to self.history by resuming the newest checkpoint from
+        before its end, or if there isn't one by running all of it again"""
+        if self.save_terminal is not None:
+            self.checkpoints.restore(len(self.history), {
+                'history': self.history,
+                'rl_history': self.rl_history.entries,
+                'scroll_offset': self.scroll_offset,
+                'size': (self.width, self.height),
+                'terminal': self.save_terminal()})
         #TODO other implementations have a enter no-history method, could do
         # that instead of clearing history and getting it rewritten
         old_logical_lines = self.history
         self.history = []
-        self.display_lines = []
+        self.display_lines.clear()
 
         self.done = True # this keeps the first prompt correct
         self.interp = code.InteractiveInterpreter()
-        self.completer = Autocomplete(self.interp.locals, self.config)
+        self.runner = CodeRunner(self.interp)
+        self.completion_cache.bump()
+        self.completer = self.new_completer()
         self.completer.autocomplete_mode = 'simple'
         self.buffer = []
         self.display_buffer = []
+        self.display_buffer_wraps.clear()
         self.highlighted_paren = None
-
-        for line in old_logical_lines:
-            self._current_line = line
-            self.set_formatted_line()
-            self.on_enter()
+        self.replay(old_logical_lines)
+
+    def replay(self, lines):
+        """Runs lines as though they'd been typed, without taking checkpoints"""
+        self.replaying = True
+        try:
+            for line in lines:
+                self._current_line = line
+                self.set_formatted_line()
+                self.on_enter()
+        finally:
+            self.replaying = False
         self.cursor_offset_in_line = 0
         self._current_line = ''
 
+    def enable_checkpoints(self, save_terminal, restore_terminal):
+        """Has undo resume checkpoints rather than rerun history
+
+        save_terminal() returns what a resumed checkpoint needs to carry on
+        drawing where this process left off, and restore_terminal(state) is
+        called with it in the checkpoint."""
+        self.save_terminal = save_terminal
+        self.restore_terminal = restore_terminal
+
+    def checkpoint(self):
+        """Forks a copy of the repl for undo to come back to; if it's
+        resumed, the copy carries on from here"""
+        # the copy only has this thread, so the locks a completion job
+        # shares with it are held as it forks, or one the job held would
+        # never be let go of
+        self.completion_worker.cancel() # its matches are for neither process
+        state = self.checkpoints.take(len(self.history), self.highlighter.locks())
+        if state is not None:
+            self.resume(state)
+
+    def resume(self, state):
+        """Takes over from the process that resumed this checkpoint, running
+        the lines of its history that came after the checkpoint"""
+        self.start_background_tasks() # threads don't survive forking
+        self.typeahead.clear() # the resuming process handled it
+        self.width, self.height = state['size']
+        self.scroll_offset = state['scroll_offset']
+        self.restore_terminal(state['terminal'])
+        self.highlighted_paren = None
+        self.replay(state['history'][len(self.history):])
+        self.rl_history.entries = state['rl_history']
+
     ## wrappers for super functions so I can add descriptive docstrings
     def tokenize(self, s, newline=False):
         """Tokenizes a line of code, returning what that line should look like,
@@ -130,8 +223,16 @@ class Repl(BpythonRepl):
             that should replace that line to unhighlight it
         - calls reprint_line with a buffer's line's tokens and the buffer lineno that has changed
             iff that line is the not the current line
+
+        Only does all that when the cursor is on a paren; otherwise the line
+        is highlighted on its own, from cached and incrementally lexed tokens.
         """
-        return super(Repl, self).tokenize(s, newline)
+        source = '\n'.join(self.buffer + [s])
+        cursor = len(source) - self.cpos + (1 if self.cpos else 0)
+        text = self.highlighter.lexer.prepare(source) # what the cursor's counted in
+        if 0 < cursor <= len(text) and text[cursor - 1] in '()[]{}':
+            return super(Repl, self).tokenize(s, newline)
+        return self.highlighter.line_tokens(source, len(self.buffer))
 
     ## Our own functions
     def unhighlight_paren(self):
@@ -144,22 +245,27 @@ class Repl(BpythonRepl):
             self.highlighted_paren = None
             logging.debug('trying to unhighlight a paren on line %r', lineno)
             logging.debug('with these tokens: %r', saved_tokens)
-            new = bpythonparse(format(saved_tokens, self.formatter))
+            new = self.highlighter.format(saved_tokens)
             self.display_buffer[lineno][:len(new)] = new
 
+    @property
+    def width(self):
+        return self.display_lines.width
+    @width.setter
+    def width(self, value):
+        self.display_lines.width = value # scrollback is wrapped to this
+
     @property
     def lines_for_display(self):
-        return self.display_lines + self.display_buffer_lines
+        """All lines above the current one, as a view that doesn't copy them"""
+        return LinesView(self.display_lines, self.display_buffer_lines)
 
     @property
     def display_buffer_lines(self):
         lines = []
-        #logging.debug('display_buffer:')
-        #logging.debug(self.display_buffer)
-        for display_line in self.display_buffer:
-            display_line = (self.ps2 if lines else self.ps1) + display_line
-            for line in paint.display_linize(display_line, self.width):
-                lines.append(line)
+        for lineno, display_line in enumerate(self.display_buffer):
+            prompt = self.ps2 if lineno else self.ps1
+            lines.extend(self.display_buffer_wraps.wrapped(lineno, prompt, display_line, self.width))
         return lines
 
     def __enter__(self):
@@ -167,27 +273,30 @@ class Repl(BpythonRepl):
         self.orig_stdout = sys.stdout
         self.orig_stderr = sys.stderr
 
-        sys.stdout = StringIO()
-        sys.stderr = StringIO()
+        self.stdout = sys.stdout = OutputCapture(self.show_output, self.config.scrollback_bytes)
+        self.stderr = sys.stderr = OutputCapture(self.show_errors, self.config.scrollback_bytes)
         return self
 
     def __exit__(self, *args):
         sys.stdout = self.orig_stdout
         sys.stderr = self.orig_stderr
+        self.runner.close()
 
     @property
     def current_display_line(self):
+        if self.running:
+            return fmtstr('') # the line being run is shown above its output
         return (self.ps1 if self.done else self.ps2) + self.current_formatted_line
 
     def start_background_tasks(self):
         t = threading.Thread(target=self.importcompletion_thread)
         t.daemon = True
         t.start()
+        self.completion_worker = BackgroundWorker()
 
     def importcompletion_thread(self):
         """quick tasks we want to do bits of during downtime"""
-        while importcompletion.find_coroutine(): # returns None when fully initialized
-            pass
+        load_import_completion(self.config.module_index)
 
     def on_enter(self):
         self.cursor_offset_in_line = 10000
@@ -197,13 +306,31 @@ class Repl(BpythonRepl):
         self.rl_history.append(self._current_line)
         self.rl_history.last()
         self.history.append(self._current_line)
-        output, err, self.done, indent = self.push(self._current_line)
-        if output:
-            self.display_lines.extend(sum([paint.display_linize(line, self.width) for line in output.split('\n')], []))
-        if err:
-            self.display_lines.extend([fmtstr(line, 'red') for line in sum([paint.display_linize(line, self.width) for line in err.split('\n')], [])])
-        self._current_line = ' '*indent
+        self.push_started = time.time()
+        self.push(self._current_line)
+        if self.run_in_background and not self.replaying:
+            return # update_running finishes up once the code is done
+        if self.interrupted is None:
+            self.runner.wait()
+        else:
+            # nothing else reads keys while replaying, so ctrl-c is looked
+            # for here: interrupted, which main sets, says if it was pressed
+            while not self.runner.wait(INTERRUPT_POLL):
+                if self.interrupted():
+                    self.runner.interrupt()
+        self.finish_enter()
+
+    def finish_enter(self):
+        """The rest of on_enter, once the code it ran is done"""
+        self.done, indent = self.finish_push()
+        seconds = time.time() - self.push_started
+        # pasted text brings its own indentation
+        self._current_line = '' if self.paste_mode else ' '*indent
         self.cursor_offset_in_line = len(self._current_line)
+        if (self.done and self.save_terminal is not None and
+                not self.replaying and not self.paste_mode and
+                self.checkpoints.due(len(self.history), seconds)):
+            self.checkpoint()
 
     def only_whitespace_left_of_cursor(self):
         """returns true if all characters on current line before cursor are whitespace"""
@@ -228,6 +355,10 @@ class Repl(BpythonRepl):
                 self.add_normal_character(' ')
             return
 
+        # matches still being found in the background are for an older line
+        if self.completion_worker.cancel():
+            self.matches_iter = MatchesIterator()
+
         # get the (manually typed or common-sequence completed from manually typed) current word
         if self.matches_iter:
             cw = self.matches_iter.current_word
@@ -259,6 +390,34 @@ class Repl(BpythonRepl):
         self.cursor_offset_in_line, self._current_line = substitute_abbreviations(self.cursor_offset_in_line, self._current_line)
         #TODO deal with characters that take up more than one space? do we care?
 
+    def on_paste(self, text):
+        """Adds pasted text a line at a time, running each completed line
+
+        Pasted text brings its own indentation and isn't abbreviation
+        substituted, and completion is left until the paste is done. Code
+        run in the background leaves the rest of the paste as typeahead,
+        for update_running to carry on with once the code's done.
+
+        What was right of the cursor ends up after the last line pasted,
+        with the cursor still just before it."""
+        if not self.paste_mode: # else carrying on from typeahead
+            self.paste_after = self._current_line[self.cursor_offset_in_line:]
+            self._current_line = self._current_line[:self.cursor_offset_in_line]
+        self.paste_mode = True
+        try:
+            lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+            for i, line in enumerate(lines):
+                if i:
+                    self.on_enter()
+                    if self.running:
+                        self.typeahead.appendleft(events.PasteEvent('\n'.join(lines[i:])))
+                        return
+                self._current_line += line
+            self.cursor_offset_in_line = len(self._current_line)
+            self._current_line += self.paste_after
+        finally:
+            self.paste_mode = self.running
+
     def process_event(self, e):
         """Returns True if shutting down, otherwise mutates state of Repl object"""
         #logging.debug("processing event %r", e)
@@ -266,7 +425,31 @@ class Repl(BpythonRepl):
             logging.debug('window change to %d %d', e.width, e.height)
             self.width, self.height = e.width, e.height
             return
-        if e in rl_char_sequences:
+        if self.pager is not None:
+            action = self.pager.process_event(e)
+            if action == 'expand':
+                self.expand_collapsed()
+            if action in ('expand', 'quit'):
+                self.pager = None
+            return
+        if e == "\x0f" and self.collapsed is not None: # ctrl-o
+            self.pager = Pager(self.collapsed.lines, paint.display_linize, self.width,
+                               self.collapsed.dropped)
+            return
+        if self.running:
+            if e == "\x03": # ctrl-c
+                self.runner.interrupt()
+                if self.paste_mode:
+                    # like a terminal flushing its input, drop what's left
+                    self.typeahead.popleft()
+                    self.paste_mode = False
+            else:
+                self.typeahead.append(e)
+            return
+        if isinstance(e, events.PasteEvent):
+            self.on_paste(e.text)
+            self.set_completion()
+        elif e in rl_char_sequences:
             self.cursor_offset_in_line, self._current_line = rl_char_sequences[e](self.cursor_offset_in_line, self._current_line)
             self.set_completion()
 
@@ -312,13 +495,13 @@ class Repl(BpythonRepl):
         self.set_formatted_line()
 
     def set_formatted_line(self):
-        self.current_formatted_line = bpythonparse(format(self.tokenize(self._current_line), self.formatter))
+        self.current_formatted_line = self.highlighter.format(self.tokenize(self._current_line))
         logging.debug(repr(self.current_formatted_line))
 
     def set_completion(self, tab=False):
         """Update autocomplete info; self.matches and self.argspec"""
         # this method stolen from bpython.cli
-        if self.paste_mode:
+        if self.paste_mode or self.running:
             return
 
         if self.list_win_visible and not self.config.auto_display_list:
@@ -326,8 +509,43 @@ class Repl(BpythonRepl):
             self.matches_iter.update(self.current_word)
             return
 
-        if self.config.auto_display_list or tab:
+        if tab:
+            self.completion_worker.cancel()
             self.list_win_visible = BpythonRepl.complete(self, tab)
+        elif self.config.auto_display_list:
+            self.completion_worker.submit(self.completion_job())
+
+    def new_completer(self):
+        """Returns a completer that caches its matches until the namespace
+        changes, which it does whenever code is run"""
+        return CachingAutocomplete(self.interp.locals, self.config, self.completion_cache)
+
+    def completion_job(self):
+        """Returns a function that completes the current line on a copy of
+        the repl, so it can run in the background while typing goes on"""
+        snapshot = copy.copy(self)
+        # what tokenize lexes with and may rewrite is the snapshot's own
+        snapshot.highlighter = self.highlighter.copy()
+        snapshot.buffer = list(self.buffer)
+        snapshot.display_buffer = list(self.display_buffer)
+        snapshot.matches_iter = MatchesIterator()
+        snapshot.completer = self.new_completer()
+        snapshot.completer.autocomplete_mode = self.completer.autocomplete_mode
+        def job():
+            snapshot.list_win_visible = BpythonRepl.complete(snapshot)
+            return snapshot
+        return job
+
+    def update_completion(self):
+        """Shows the results of background completion if they've arrived,
+        returning whether they had"""
+        snapshot = self.completion_worker.take()
+        if snapshot is None:
+            return False
+        for attr in ('matches', 'matches_iter', 'argspec', 'docstring',
+                     'current_func', 'list_win_visible'):
+            setattr(self, attr, getattr(snapshot, attr))
+        return True
 
     @property
     def current_word(self):
@@ -354,10 +572,9 @@ class Repl(BpythonRepl):
         self.cursor_offset_in_line = start + len(value)
 
     def push(self, line):
-        """Push a line of code onto the buffer, run the buffer
+        """Push a line of code onto the buffer, start running the buffer
 
-        If the interpreter successfully runs the code, clear the buffer
-        Return ("for stdout", "for_stderr", finished?)
+        finish_push is to be called once it's done running.
         """
         self.buffer.append(line)
         indent = len(re.match(r'[ ]*', line).group())
@@ -368,64 +585,196 @@ class Repl(BpythonRepl):
             indent = max(0, indent - INDENT_AMOUNT)
         elif line and ':' not in line and line.strip().startswith(('return', 'pass', 'raise', 'yield')):
             indent = max(0, indent - INDENT_AMOUNT)
-        out_spot = sys.stdout.tell()
-        err_spot = sys.stderr.tell()
+        self.next_indent = indent
+        self.display_buffer.append(self.highlighter.format(self.tokenize(line))) #current line not added to display buffer if quitting
         #logging.debug('running %r in interpreter', self.buffer)
-        unfinished = self.interp.runsource('\n'.join(self.buffer))
-        self.display_buffer.append(bpythonparse(format(self.tokenize(line), self.formatter))) #current line not added to display buffer if quitting
-        sys.stdout.seek(out_spot)
-        sys.stderr.seek(err_spot)
-        out = sys.stdout.read()
-        err = sys.stderr.read()
-        if unfinished and not err:
+        self.errored = False
+        self.output_rows = 0
+        self.collapse_limit = self.config.collapse_output
+        self.collapsing = None
+        self.running = True
+        self.runner.start('\n'.join(self.buffer))
+
+    def finish_push(self):
+        """Shows the last of the output of the code push ran, and if the
+        interpreter successfully ran it, clears the buffer
+
+        Return (finished?, indent of the next line)
+        """
+        self.stdout.finish()
+        self.stderr.finish()
+        self.take_output()
+        self.running = False
+        self.completion_cache.bump()
+        self.completer = self.new_completer()
+        if self.runner.exit is not None:
+            raise self.runner.exit
+        indent = self.next_indent
+        if self.runner.unfinished and not self.errored:
             logging.debug('unfinished - line added to buffer')
-            return (None, None, False, indent)
+            return (False, indent)
         else:
             logging.debug('finished - buffer cleared')
-            self.display_lines.extend(self.display_buffer_lines)
-            self.display_buffer = []
+            self.finish_display_buffer()
             self.buffer = []
-            if err:
+            if self.errored:
                 indent = 0
-            return (out[:-1], err[:-1], True, indent)
+            return (True, indent)
 
-    def paint(self, about_to_exit=False):
-        """Returns an array of min_height or more rows and width columns, plus cursor position"""
+    def finish_display_buffer(self):
+        """Moves the lines of code being run up into the scrollback"""
+        self.display_lines.extend((self.ps2 if lineno else self.ps1) + line
+                                  for lineno, line in enumerate(self.display_buffer))
+        self.display_buffer = []
+        self.display_buffer_wraps.clear()
+
+    def show_output(self, lines):
+        """Queues lines written to stdout, from whichever thread wrote them,
+        to be displayed by take_output"""
+        self.pending_output.append(lines)
+
+    def show_errors(self, lines):
+        self.errored = True
+        self.pending_output.append([fmtstr(line, 'red') for line in lines])
+
+    def take_output(self):
+        """Moves lines written since it was last called into the display,
+        returning whether there were any"""
+        if not self.pending_output:
+            return False
+        if self.running:
+            # only complete code runs, so the code's done being typed
+            self.finish_display_buffer()
+        lines = []
+        while self.pending_output:
+            lines.extend(self.pending_output.popleft())
+        self.add_output(lines)
+        return True
+
+    def add_output(self, lines):
+        """Adds lines of output to the scrollback, collapsing what's past
+        the first collapse_limit rows since code was last run into one line"""
+        if not self.collapse_limit:
+            self.display_lines.extend(lines)
+            return
+        width = self.width or 80
+        for i, line in enumerate(lines):
+            room = self.collapse_limit - self.output_rows
+            rows = max(1, rows_needed(len(line), width))
+            if rows > room:
+                break
+            self.output_rows += rows
+        else:
+            self.display_lines.extend(lines)
+            return
+        self.display_lines.extend(lines[:i])
+        hidden = lines[i:]
+        if room > 0: # show the start of a long line
+            self.display_lines.append(hidden[0][:room * width])
+            hidden[0] = hidden[0][room * width:]
+            self.output_rows += room
+        if self.collapsing is None:
+            self.collapsing = self.collapsed = CollapsedOutput(self.config.scrollback_lines,
+                                                               self.config.scrollback_bytes)
+        elif self.collapsing.seq == self.display_lines.last_seq():
+            self.display_lines.pop() # the summary, rewritten below
+        self.collapsing.extend(hidden)
+        self.display_lines.append(fmtstr('... %d more lines: ctrl-o to page through them'
+                                         % self.collapsing.total(), 'invert'))
+        self.collapsing.seq = self.display_lines.last_seq()
+
+    def expand_collapsed(self):
+        """Puts the lines of the latest collapsed output in the scrollback
+        in place of the line standing in for them"""
+        lines = list(self.collapsed.lines)
+        if self.collapsed.dropped:
+            lines.insert(0, fmtstr('... %d lines dropped, over the scrollback limit'
+                                   % self.collapsed.dropped, 'invert'))
+        if self.display_lines.replace(self.collapsed.seq, lines):
+            if self.collapsing is self.collapsed:
+                self.collapsing = None
+                self.collapse_limit = 0 # show the rest of it too
+            self.collapsed = None
+
+    def update_running(self):
+        """Shows output of code running in the background, and finishes up
+        once it's done, then handles what was typed meanwhile; returns
+        whether there was anything new to show"""
+        changed = self.take_output()
+        if self.running and not self.runner.running:
+            self.finish_enter()
+            self.set_completion()
+            self.set_formatted_line()
+            while self.typeahead and not self.running:
+                self.process_event(self.typeahead.popleft())
+            changed = True
+        return changed
+
+    def paint(self, about_to_exit=False, frame=None):
+        """Returns a list of min_height or more rows no wider than width, plus cursor position
+
+        If frame, a cellframe.CellFrame, is passed, it's cleared and painted
+        into and returned instead of the list."""
 
         if about_to_exit:
+            self.pager = None
             self.clean_up_current_line_for_exit()
+        if self.pager is not None:
+            rows, cursor = self.pager.paint(self.width, self.height)
+            if frame is None:
+                return rows, cursor
+            frame.clear(self.width)
+            frame.blit(rows, 0)
+            return frame, cursor
 
         width, min_height = self.width, self.height
-        arr = FSArray(0, width)
-        current_line_start_row = len(self.lines_for_display) - self.scroll_offset
-
-        history = paint.paint_history(current_line_start_row, width, self.lines_for_display)
-        arr[:history.height,:history.width] = history
+        # lines dropped from the top of the scrollback were offscreen
+        self.scroll_offset = max(0, self.scroll_offset - self.display_lines.take_evicted())
+        lines_for_display = self.lines_for_display
+        # reflowing at a new width can leave fewer lines than were offscreen
+        self.scroll_offset = min(self.scroll_offset, len(lines_for_display))
+        current_line_start_row = len(lines_for_display) - self.scroll_offset
+
+        if frame is None:
+            arr = paint.paint_history(current_line_start_row, width, lines_for_display)
+            blit = lambda rows, top: paint.blit(arr, rows, top)
+        else:
+            arr = frame
+            arr.clear(width)
+            arr.blit(lines_for_display[max(0, len(lines_for_display) - current_line_start_row):], 0)
+            blit = arr.blit
+        history_height = len(arr)
 
         current_line = paint.paint_current_line(min_height, width, self.current_display_line)
-        arr[current_line_start_row:current_line_start_row + current_line.height,
-            0:current_line.width] = current_line
+        blit(current_line, current_line_start_row)
 
-        if current_line.height > min_height:
+        if len(current_line) > min_height:
             return arr, (0, 0) # short circuit, no room for infobox
 
         lines = paint.display_linize(self.current_display_line+'X', width)
                                        # extra character for space for the cursor
         cursor_row = current_line_start_row + len(lines) - 1
         cursor_column = (self.cursor_offset_in_line + len(self.current_display_line) - len(self._current_line)) % width
+        if self.running:
+            cursor_column = 0
 
         if self.list_win_visible:
             logging.debug('infobox display code running')
-            visible_space_above = history.height
+            visible_space_above = history_height
             visible_space_below = min_height - cursor_row
             info_max_rows = max(visible_space_above, visible_space_below)
-            infobox = paint.paint_infobox(info_max_rows, width, self.matches, self.argspec, self.current_word, self.docstring, self.config)
+            infobox = paint.infobox_lines(info_max_rows, width, self.matches, self.argspec, self.current_word, self.docstring)
+            infobox_height = infobox[2]
 
-            if visible_space_above >= infobox.height and not INFOBOX_ONLY_BELOW:
-                arr[current_line_start_row - infobox.height:current_line_start_row, 0:infobox.width] = infobox
+            if visible_space_above >= infobox_height and not INFOBOX_ONLY_BELOW:
+                top = current_line_start_row - infobox_height
+            else:
+                top = cursor_row + 1
+                logging.debug('slamming infobox of height %r into arr', infobox_height)
+            if frame is None:
+                blit(paint.border(*infobox), top)
             else:
-                arr[cursor_row + 1:cursor_row + 1 + infobox.height, 0:infobox.width] = infobox
-                logging.debug('slamming infobox of shape %r into arr', infobox.shape)
+                frame.blit_box(top, *infobox)
 
         return arr, (cursor_row, cursor_column)
 
@@ -433,7 +782,7 @@ class Repl(BpythonRepl):
     def dumb_print_output(self):
         rows, columns = self.height, self.width
         arr, cpos = self.paint()
-        arr[cpos[0], cpos[1]] = '~'
+        paint.blit(arr, ['~'], cpos[0], cpos[1])
         def my_print(msg):
             self.orig_stdout.write(str(msg)+'\n')
         my_print('X'*(columns+8))
@@ -442,7 +791,7 @@ class Repl(BpythonRepl):
         my_print('X'*(columns+8))
         my_print('X..'+('.'*(columns+2))+'..X')
         for line in arr:
-            my_print('X...'+(line if line else ' '*len(line))+'...X')
+            my_print('X...'+line+' '*(columns - len(line))+'...X')
         logging.debug('line:')
         logging.debug(repr(line))
         my_print('X..'+('.'*(columns+2))+'..X')
@@ -474,4 +823,5 @@ def test():
             r.dumb_input()
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.DEBUG, filename='repl.log')
     test()
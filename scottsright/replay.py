@@ -0,0 +1,213 @@
+"""Recording the events of a session, and replaying them headlessly to find
+out how long handling and painting each one takes
+
+A recording has a line per event: the seconds since recording began, then
+what the event was, like
+
+    0.000000 resize 24 80
+    1.204518 key 'a'
+    1.876302 key '\\x1b[A'
+    2.310033 paste 'x = 1\\ry = 2'
+
+spy --record FILE records one; replaying it pushes each event through
+Repl.process_event and paints and renders a frame after it as main does,
+to a terminal controller writing to /dev/null, either as fast as it can or
+as far apart as the events were recorded.
+
+    python -m scottsright.replay [--realtime] [--profile FILE] RECORDING
+"""
+
+import os
+import ast
+import time
+import cProfile
+import optparse
+
+from scottsright import events
+from scottsright.terminal import Terminal
+from scottsright.terminalcontrol import TerminalController
+
+POLL_INTERVAL = .01 # seconds between checks on running code and completion
+DEFAULT_SIZE = (24, 80) # for a recording that doesn't start with a resize
+PERCENTILES = (50, 90, 99)
+SLOWEST = 5 # events listed in the report
+
+class Recorder(object):
+    """Writes events to a file as they're passed to record, with when"""
+    def __init__(self, f):
+        self.f = f
+        self.start = time.time()
+
+    def record(self, e):
+        self.f.write('%f %s\n' % (time.time() - self.start, format_event(e)))
+        self.f.flush() # a session that crashes is the one most worth replaying
+
+def format_event(e):
+    """
+    >>> format_event(events.WindowChangeEvent(24, 80))
+    'resize 24 80'
+    >>> format_event('\\x1b[A')
+    "key '\\\\x1b[A'"
+    """
+    if isinstance(e, events.WindowChangeEvent):
+        return 'resize %d %d' % (e.rows, e.columns)
+    if isinstance(e, events.PasteEvent):
+        return 'paste %r' % e.text
+    return 'key %r' % e
+
+def parse_event(s):
+    """
+    >>> parse_event('resize 24 80')
+    <WindowChangeEvent (24, 80)>
+    >>> parse_event(format_event(events.PasteEvent('a\\rb')))
+    <PasteEvent 'a\\rb'>
+    """
+    kind, rest = s.split(' ', 1)
+    if kind == 'resize':
+        return events.WindowChangeEvent(*[int(n) for n in rest.split()])
+    if kind == 'paste':
+        return events.PasteEvent(ast.literal_eval(rest))
+    if kind == 'key':
+        return ast.literal_eval(rest)
+    raise ValueError('unknown event %r' % s)
+
+def read_recording(f):
+    """The (seconds, event) pairs recorded in f"""
+    recorded = []
+    for line in f:
+        if line.strip():
+            when, event = line.rstrip('\n').split(' ', 1)
+            recorded.append((float(when), parse_event(event)))
+    return recorded
+
+class Session(object):
+    """A repl painted the way main paints it, to a terminal that's not there"""
+    def __init__(self, size, config=None):
+        # imported here so that main can record without waiting on them
+        from scottsright.repl import Repl
+        from scottsright.cellframe import CellFrame
+        self.size = size
+        self.out = open(os.devnull, 'w')
+        self.tc = TerminalController(open(os.devnull), self.out)
+        self.tc.get_screen_size = lambda: self.size
+        self.term = Terminal(self.tc)
+        self.term.top_usable_row = 1
+        self.repl = Repl(config)
+        self.repl.run_in_background = True
+        self.frame = CellFrame(size[1])
+
+    def __enter__(self):
+        self.repl.__enter__()
+        self.repl.height, self.repl.width = self.size
+        self.paint()
+        return self
+
+    def __exit__(self, *args):
+        self.repl.__exit__(*args)
+        self.out.close()
+
+    def paint(self, about_to_exit=False):
+        _, cursor_pos = self.repl.paint(about_to_exit=about_to_exit, frame=self.frame)
+        self.repl.scroll_offset += self.term.render_to_terminal(self.frame, cursor_pos)
+
+    def event(self, e):
+        """Handles e and paints, returning whether the repl is done"""
+        if isinstance(e, events.WindowChangeEvent):
+            self.size = (e.rows, e.columns)
+        try:
+            self.repl.process_event(e)
+        except SystemExit:
+            self.paint(about_to_exit=True)
+            return True
+        self.paint()
+        return False
+
+    def update(self):
+        """Shows what running code and completion have come up with, as
+        main does between events"""
+        changed = self.repl.update_running()
+        changed = self.repl.update_completion() or changed
+        if changed:
+            self.paint()
+
+    def busy(self):
+        return self.repl.running or self.repl.completion_worker.busy
+
+def replay(recorded, realtime=False, profile=None, config=None):
+    """Replays (seconds, event) pairs, returning (seconds, event) pairs of
+    how long each took to handle and paint, in a repl with config if it's
+    passed, else the user's
+
+    Replaying as fast as it can, running code and background completion
+    are waited for between events, so that each event finds the repl as it
+    would have been; realtime replays wait as long as the recording did.
+    Only handling and painting events is profiled, into profile, a
+    cProfile.Profile, if one's passed."""
+    size = DEFAULT_SIZE
+    if recorded and isinstance(recorded[0][1], events.WindowChangeEvent):
+        size = (recorded[0][1].rows, recorded[0][1].columns)
+    latencies = []
+    with Session(size, config) as session:
+        start = time.time()
+        for when, e in recorded:
+            if realtime:
+                while time.time() - start < when:
+                    time.sleep(max(0, min(POLL_INTERVAL, when - (time.time() - start))))
+                    session.update()
+            else:
+                while session.busy():
+                    time.sleep(POLL_INTERVAL)
+                    session.update()
+            session.update()
+            began = time.time()
+            if profile is not None:
+                profile.enable()
+            done = session.event(e)
+            if profile is not None:
+                profile.disable()
+            latencies.append((time.time() - began, e))
+            if done:
+                break
+    return latencies
+
+def percentile(values, p):
+    """The value p percent of values are no more than
+
+    >>> percentile(range(1, 101), 90), percentile([3, 1, 2], 50)
+    (90, 2)
+    """
+    values = sorted(values)
+    return values[max(0, -(-len(values) * p // 100) - 1)]
+
+def report(latencies):
+    """Percentiles of how long events took, and the slowest events"""
+    seconds = [s for s, _ in latencies]
+    if not seconds:
+        return 'no events replayed'
+    lines = ['%d events, ms per event' % len(seconds),
+             '  '.join('p%d %.2f' % (p, percentile(seconds, p) * 1000) for p in PERCENTILES) +
+             '  max %.2f' % (max(seconds) * 1000),
+             'slowest:']
+    for s, e in sorted(latencies, key=lambda (s, e): -s)[:SLOWEST]:
+        lines.append('  %8.2f  %s' % (s * 1000, format_event(e)))
+    return '\n'.join(lines)
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [--realtime] [--profile FILE] RECORDING')
+    parser.add_option('--realtime', action='store_true',
+                      help='wait between events as long as the recording did')
+    parser.add_option('--profile', metavar='FILE',
+                      help='write cProfile stats of handling and painting events to FILE')
+    options, args = parser.parse_args()
+    if len(args) != 1:
+        parser.error('a recording to replay is needed')
+    with open(args[0]) as f:
+        recorded = read_recording(f)
+    profile = cProfile.Profile() if options.profile else None
+    latencies = replay(recorded, realtime=options.realtime, profile=profile)
+    if profile is not None:
+        profile.dump_stats(options.profile)
+    print report(latencies)
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,14 @@
 
 from fmtstr.fmtstr import *
-from fmtstr.fsarray import fsarray
 
 import logging
 
 #TODO take the boring parts of repl.paint out into here?
 
 # All paint functions should
-# * return an array of the width they were asked for
-# * return an array not larger than the height they were asked for
+# * return a list of rows no wider than the width they were asked for
+# * return a list not longer than the height they were asked for
+# Rows aren't padded with spaces: the terminal erases the rest of short rows
 
 def display_linize(msg, columns):
     display_lines = ([msg[start:end]
@@ -19,17 +19,33 @@ def display_linize(msg, columns):
     return display_lines
 
 def paint_history(rows, columns, display_lines):
-    lines = []
-    for r, line in zip(range(rows), display_lines[-rows:]):
-        lines.append((fmtstr(line)+' '*1000)[:columns])
-    r = fsarray(lines)
-    assert r.shape[0] <= rows, repr(r.shape)+' '+repr(rows)
-    assert r.shape[1] <= columns, repr(r.shape)+' '+repr(columns)
-    return r
+    """Returns the last rows lines of display_lines, cut to columns
+
+    Only the lines that will be shown are looked at, so display_lines can be
+    any view supporting len and slicing."""
+    lines = display_lines[max(0, len(display_lines) - rows):]
+    return [fmtstr(line)[:columns] if len(line) > columns else fmtstr(line)
+            for line in lines]
 
 def paint_current_line(rows, columns, current_display_line):
-    lines = display_linize(current_display_line, columns)
-    return fsarray([(line+' '*columns)[:columns] for line in lines])
+    return [fmtstr(line) for line in display_linize(current_display_line, columns)]
+
+def blit(rows, new_rows, top, left=0):
+    """Paints new_rows over rows starting at row top and column left
+
+    rows are added as needed, and the parts of existing rows not covered by
+    the new ones are kept."""
+    while len(rows) < top + len(new_rows):
+        rows.append(fmtstr(''))
+    for i, new in enumerate(new_rows):
+        old = rows[top + i]
+        if left == 0 and len(new) >= len(old):
+            rows[top + i] = fmtstr(new)
+            continue
+        if len(old) < left:
+            old = old + ' ' * (left - len(old))
+        rows[top + i] = fmtstr(old[:left] + new + old[left + len(new):])
+    return rows
 
 def matches_lines(rows, columns, matches, current):
     highlight_color = lambda x: red(on_blue(x))
@@ -37,10 +53,13 @@ def matches_lines(rows, columns, matches, current):
         return []
     max_match_width = max(len(m) for m in matches)
     words_wide = max(1, (columns - 1) / (max_match_width + 1))
+    # only the row with the current match needs to be a fmtstr
     matches_lines = [fmtstr(' ').join(m.ljust(max_match_width)
                                         if m != current
                                         else highlight_color(m) + ' '*(max_match_width - len(m))
                                       for m in matches[i:i+words_wide])
+                     if current in matches[i:i+words_wide]
+                     else ' '.join(m.ljust(max_match_width) for m in matches[i:i+words_wide])
                      for i in range(0, len(matches), words_wide)]
     logging.debug('match: %r' % current)
     logging.debug('matches_lines: %r' % matches_lines)
@@ -51,8 +70,13 @@ def formatted_argspec(argspec):
 
 def paint_infobox(rows, columns, matches, argspec, match, docstring, config):
     """Returns painted completions, argspec, match, docstring etc."""
+    return border(*infobox_lines(rows, columns, matches, argspec, match, docstring))
+
+def infobox_lines(rows, columns, matches, argspec, match, docstring):
+    """Returns the lines inside the infobox's border, how wide they are and
+    how many rows the infobox takes up, border included"""
     if not (rows and columns):
-        return fsarray(0, 0)
+        return [], 0, 0
     lines = ([on_blue(red("Infobox test"))] +
              (display_linize(blue(formatted_argspec(argspec)), columns-2) if argspec else []) +
              (display_linize(str(argspec), columns-2) if argspec else []) +
@@ -60,17 +84,19 @@ def paint_infobox(rows, columns, matches, argspec, match, docstring, config):
              (matches_lines(rows, columns, matches, match) if matches else [])
              )
 
-    # add borders
     width = min(columns - 2, max([len(line) for line in lines]))
+    return lines, width, max(0, min(len(lines) + 2, rows - 1))
+
+def border(lines, width, height):
+    """Returns the infobox rows for its lines, bordered and cut to height"""
     output_lines = []
     output_lines.append('+'+'-'*width+'+')
     for line in lines:
-        output_lines.append('|'+((line+' '*(width - len(line)))[:width])+'|')
+        if len(line) > width: # slicing a fmtstr means parsing it again
+            line = line[:width]
+        output_lines.append('|'+line+' '*(width - len(line))+'|')
     output_lines.append('+'+'-'*width+'+')
-    r = fsarray(output_lines[:rows])
-    assert len(r.shape) == 2
-    #return r
-    return fsarray(r[:rows-1, :])
+    return [fmtstr(line) for line in output_lines[:height]]
 
 if __name__ == '__main__':
     #paint_history(10, 30, ['asdf', 'adsf', 'aadadfadf']).dumb_display()
@@ -81,4 +107,5 @@ if __name__ == '__main__':
                       match='asdf',
                       docstring='Something Interesting',
                       config=None)
-    h.dumb_display()
+    for line in h:
+        print line
@@ -0,0 +1,31 @@
+"""Settings for scottsright, read from the [scottsright] section of the
+bpython config file"""
+
+import os
+from ConfigParser import ConfigParser
+
+DEFAULTS = {
+    'scrollback_lines': 10000, # 0 for no limit
+    'scrollback_bytes': 0,     # 0 for no limit
+    'max_fps': 60.0,           # while input keeps arriving
+    'collapse_output': 1000,   # rows of output shown before the rest are
+                               # collapsed into one line; 0 for no limit
+    'module_index': '~/.cache/scottsright/modules.json', # '' to not keep one
+    'checkpoints': 8,          # kept for undo; 0 to rerun history instead
+    'checkpoint_lines': 20,    # run between checkpoints
+    'checkpoint_seconds': 1.0, # a line taking this long gets one of its own
+    'checkpoint_bytes': 1 << 30, # none taken while the repl has more than
+                               # this resident, which each copy could come
+                               # to take too; 0 for no limit
+    }
+
+def load_settings(struct, configfile):
+    """Stores scottsright's settings from configfile in struct"""
+    config = ConfigParser()
+    config.read(os.path.expanduser(configfile))
+    for option, default in DEFAULTS.items():
+        if config.has_option('scottsright', option):
+            value = type(default)(config.get('scottsright', option))
+        else:
+            value = default
+        setattr(struct, option, value)
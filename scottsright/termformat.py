@@ -14,9 +14,35 @@ def write_from_arrays(array, farray, fhandle, row, columns):
     text = formatted_text(array[row][columns], farray[row][columns])
     fhandle.write(text)
 
+RESET = '\033[0m'
+SGR = '\033[%dm'
+
+# the sequences turning on each combination of attribute bits; bit n is
+# attribute n + 1 (bold, dark, ...)
+ATTRIBUTE_SEQUENCES = [''.join(SGR % (bit + 1) for bit in range(8) if attrs & (1 << bit))
+                       for attrs in range(256)]
+
+SEQUENCES = {} # (color, on_color, attrs, after_formatted) -> format_sequence()
+
+def format_sequence(f, after_formatted):
+    """What switches to format f = (color, on_color, attrs); after_formatted
+    is whether the text before was formatted, so needs resetting first"""
+    color, on_color, attrs = f
+    if color == on_color == attrs == 0:
+        return RESET
+    text = RESET if after_formatted else ''
+    if color != 0:
+        text += SGR % color
+    if on_color != 0:
+        text += SGR % on_color
+    return text + ATTRIBUTE_SEQUENCES[attrs & 0xff]
+
 def formatted_text(character_list, format_array):
     r"""Returns text formatted according to the format_array
 
+    Only the characters where the format changes are looked at, found all
+    at once by comparing each row of format_array with the one before.
+
     >>> formatted_text('hello', numpy.array([[0,0,0], [0,0,0], [0,0,0], [0,0,0], [0,0,0]]))
     'hello'
     >>> formatted_text('hello!', numpy.array([[0,0,0], [31,0,0], [32,0,0], [32,0,0], [0,0,0], [0,0,0]]))
@@ -24,43 +50,35 @@ def formatted_text(character_list, format_array):
 
     """
     assert len(character_list) == len(format_array)
+    format_array = numpy.asarray(format_array)
+    if not len(format_array):
+        return ''
     assert format_array.shape[1] == 3
-    RESET = '\033[0m'
-
-    prev_format = [0, 0, 0]
+    text = ''.join(character_list)
 
-    text_list = []
-
-    for char, f in zip(character_list, format_array):
-        text = ''
-        if prev_format == list(f):
-            text_list.append(char)
-            continue
-
-        color, on_color, attrs = f
-        if color == on_color == attrs == 0:
-            text_list.append(RESET + char)
-            prev_format = [color, on_color, attrs]
-            continue
+    formatted = format_array.any(axis=1)
+    changes = numpy.empty(len(format_array), dtype=bool)
+    changes[0] = formatted[0]
+    changes[1:] = numpy.diff(format_array, axis=0).any(axis=1)
 
-        text = RESET if prev_format != [0, 0, 0] else ''
-        prev_format = list(f)
+    starts = numpy.flatnonzero(changes)
+    after_formatted = formatted[numpy.maximum(starts - 1, 0)] & (starts > 0)
 
-        fmt_str = '\033[%dm'
-        if color != 0:
-            text += fmt_str % color
-        if on_color != 0:
-            text += fmt_str % on_color
-        if attrs != 0:
-            # something stupid like below?
-            for attr, use in zip(range(1, 9), reversed([bool(int(x)) for x in ('0' * 8 + bin(attrs)[2:])[-8:]])):
-                if use:
-                    text += fmt_str % attr
-        text += char
-
-        text_list.append(text)
-
-    return ''.join(text_list) + (RESET if prev_format != [0, 0, 0] else '')
+    text_list = []
+    end = 0
+    for start, f, after in zip(starts.tolist(), format_array[starts].tolist(),
+                               after_formatted.tolist()):
+        text_list.append(text[end:start])
+        key = (f[0], f[1], f[2], after)
+        sequence = SEQUENCES.get(key)
+        if sequence is None:
+            sequence = SEQUENCES[key] = format_sequence(f, after)
+        text_list.append(sequence)
+        end = start
+    text_list.append(text[end:])
+    if formatted[-1]:
+        text_list.append(RESET)
+    return ''.join(text_list)
 
 if __name__ == '__main__':
     from termformatconstants import *
@@ -9,7 +9,37 @@ from fmtstr.fsarray import FSArray
 
 import events
 
-logging.basicConfig(filename='terminal.log',level=logging.DEBUG)
+
+def cells(line):
+    """Returns a list of (character, formatting) pairs for a str or fmtstr"""
+    if isinstance(line, basestring):
+        return [(c, ()) for c in line]
+    result = []
+    for bfs in line.basefmtstrs:
+        atts = tuple(sorted(bfs.atts.items()))
+        result.extend((c, atts) for c in bfs.s)
+    return result
+
+def changed_span(old, new):
+    """Returns the (start, end) indices of new that differ from old
+
+    >>> changed_span(list('hello'), list('hallo'))
+    (1, 2)
+    >>> changed_span(list('hello'), list('hello there'))
+    (5, 11)
+    >>> changed_span(list('hello there'), list('hello'))
+    (5, 5)
+    """
+    shortest = min(len(old), len(new))
+    start = 0
+    while start < shortest and old[start] == new[start]:
+        start += 1
+    if len(old) != len(new):
+        return start, len(new)
+    end = len(new)
+    while end > start and old[end-1] == new[end-1]:
+        end -= 1
+    return start, end
 
 
 class Terminal(object):
@@ -28,9 +58,13 @@ class Terminal(object):
             erase_line()
             down, up, left, back()
             get_event() -> 'c' | events.WindowChangeEvent(rows, columns)
+            frame() -> context manager that batches writes into one
         """
         logging.debug('-------initializing Terminal object %r------' % self)
         self.tc = tc
+        self._rendered = {} # row -> (str of line, cells) last written there
+        self._screen = None # (codepoints, formatting, known) of each row, for CellFrames
+        self._last_screen_size = None
 
     def __enter__(self):
         self.top_usable_row, _ = self.tc.get_cursor_position()
@@ -39,13 +73,14 @@ class Terminal(object):
 
     def __exit__(self, type, value, traceback):
         logging.debug("running __exit__")
-        self.tc.scroll_down()
-        row, _ = self.tc.get_cursor_position()
-        for i in range(1000):
-            self.tc.erase_line()
-            self.tc.down()
-        self.tc.set_cursor_position((row, 1))
-        self.tc.erase_rest_of_line()
+        with self.tc.frame():
+            self.tc.scroll_down()
+            row, _ = self.tc.get_cursor_position()
+            for i in range(1000):
+                self.tc.erase_line()
+                self.tc.down()
+            self.tc.set_cursor_position((row, 1))
+            self.tc.erase_rest_of_line()
 
     def render_to_terminal(self, array, cursor_pos=(0,0)):
         """Renders array to terminal, returns the number of lines
@@ -58,37 +93,155 @@ class Terminal(object):
         if array received is of height too small, render it anyway
         if array received is of height too large, render it, scroll down,
             and render the rest of it, then return how much we scrolled down
+
+        Only the cells that changed since the last call are written, all in
+        one frame; a change in screen size causes a full redraw.
+
+        array is a list of strs and fmtstrs, or a cellframe.CellFrame.
         """
-        #TODO add cool render-on-change caching
-        #TODO take a formatting array with same dimensions as array
+        if hasattr(array, 'planes'): # a CellFrame
+            return self.render_frame(array, cursor_pos)
+        self._screen = None
+        with self.tc.frame():
+            height, width = self.tc.get_screen_size()
+            if (height, width) != self._last_screen_size:
+                self.invalidate()
+                self._last_screen_size = (height, width)
+            rows_for_use = range(self.top_usable_row, height + 1)
+            shared = min(len(array), len(rows_for_use))
+            for row, line in zip(rows_for_use[:shared], array[:shared]):
+                self.render_row(row, line, width)
+            rest_of_lines = array[shared:]
+            rest_of_rows = rows_for_use[shared:]
+            for row in rest_of_rows: # if array too small
+                if self._rendered.get(row) == ('', []):
+                    continue
+                self.tc.set_cursor_position((row, 1))
+                self.tc.erase_line()
+                self._rendered[row] = ('', [])
+            offscreen_scrolls = 0
+            for line in rest_of_lines: # if array too big
+                logging.debug('sending scroll down message')
+                self.tc.set_cursor_position((height, 1)) # rows we skipped leave the cursor elsewhere
+                self.tc.scroll_down()
+                self._rendered = {row - 1: rendered
+                                  for row, rendered in self._rendered.items()
+                                  if row > 1}
+                self._rendered[height] = ('', [])
+                if self.top_usable_row > 1:
+                    self.top_usable_row -= 1
+                else:
+                    offscreen_scrolls += 1
+                logging.debug('new top_usable_row: %d' % self.top_usable_row)
+                self.render_row(height, line, width)
+
+            self.tc.set_cursor_position((cursor_pos[0]-offscreen_scrolls+self.top_usable_row, cursor_pos[1]+1))
+            return offscreen_scrolls
 
-        height, width = self.tc.get_screen_size()
-        rows_for_use = range(self.top_usable_row, height + 1)
-        shared = min(len(array), len(rows_for_use))
-        for row, line in zip(rows_for_use[:shared], array[:shared]):
+    def render_row(self, row, line, width):
+        """Writes the cells of line that differ from what's on screen at row"""
+        s = str(line)
+        previous = self._rendered.get(row)
+        if previous is not None and previous[0] == s:
+            return
+        new_cells = cells(line)
+        self._rendered[row] = (s, new_cells)
+        if previous is None:
             self.tc.set_cursor_position((row, 1))
-            self.tc.write(str(line))
-            if len(line) < width:
+            self.tc.write(s)
+            if len(new_cells) < width:
                 self.tc.erase_rest_of_line()
-        rest_of_lines = array[shared:]
-        rest_of_rows = rows_for_use[shared:]
-        for row in rest_of_rows: # if array too small
-            self.tc.set_cursor_position((row, 1))
-            self.tc.erase_line()
-        offscreen_scrolls = 0
-        for line in rest_of_lines: # if array too big
-            logging.debug('sending scroll down message')
-            self.tc.scroll_down()
-            if self.top_usable_row > 1:
-                self.top_usable_row -= 1
-            else:
-                offscreen_scrolls += 1
-            logging.debug('new top_usable_row: %d' % self.top_usable_row)
-            self.tc.set_cursor_position((height, 1)) # since scrolling moves the cursor
-            self.tc.write(str(line))
+            return
+        old_cells = previous[1]
+        start, end = changed_span(old_cells, new_cells)
+        if start < end:
+            self.tc.set_cursor_position((row, start + 1))
+            self.tc.write(str(line[start:end]))
+        if len(new_cells) < len(old_cells) and len(new_cells) < width:
+            if start >= end:
+                self.tc.set_cursor_position((row, len(new_cells) + 1))
+            self.tc.erase_rest_of_line()
+
+    def render_frame(self, frame, cursor_pos):
+        """render_to_terminal for a CellFrame, which finds the rows that
+        changed by comparing it with what's on screen all at once"""
+        # numpy's imported only once there's a frame to render, as it takes
+        # longer than drawing the first prompt
+        import numpy
+        with self.tc.frame():
+            height, width = self.tc.get_screen_size()
+            if (height, width) != self._last_screen_size:
+                self.invalidate()
+                self._last_screen_size = (height, width)
+            if self._screen is None:
+                self._screen = (numpy.zeros((height, width), dtype=numpy.uint32),
+                                numpy.zeros((height, width), dtype=numpy.uint32),
+                                numpy.zeros(height, dtype=bool))
+            self._rendered = {}
+            chars, attrs, known = self._screen
+            new_chars, new_attrs = frame.planes(width)
+            top = self.top_usable_row - 1
+            shared = max(0, min(len(frame), height - top))
+            differs = ((new_chars[:shared] != chars[top:top + shared]) |
+                       (new_attrs[:shared] != attrs[top:top + shared]))
+            changed = ~known[top:top + shared] | differs.any(axis=1)
+            for i in numpy.flatnonzero(changed):
+                self.render_frame_row(top + i, new_chars[i], new_attrs[i], differs[i], width)
+            rest = numpy.arange(top + shared, height)
+            for i in rest[~known[rest] | chars[rest].any(axis=1)]: # if frame too small
+                self.tc.set_cursor_position((i + 1, 1))
+                self.tc.erase_line()
+                chars[i] = attrs[i] = 0
+                known[i] = True
+            offscreen_scrolls = 0
+            for i in range(shared, len(frame)): # if frame too big
+                logging.debug('sending scroll down message')
+                self.tc.set_cursor_position((height, 1))
+                self.tc.scroll_down()
+                for plane in self._screen:
+                    plane[:-1] = plane[1:]
+                chars[-1] = attrs[-1] = 0
+                known[-1] = True
+                if self.top_usable_row > 1:
+                    self.top_usable_row -= 1
+                else:
+                    offscreen_scrolls += 1
+                self.render_frame_row(height - 1, new_chars[i], new_attrs[i],
+                                      (new_chars[i] != 0) | (new_attrs[i] != 0), width)
+
+            self.tc.set_cursor_position((cursor_pos[0]-offscreen_scrolls+self.top_usable_row, cursor_pos[1]+1))
+            return offscreen_scrolls
+
+    def render_frame_row(self, i, new_chars, new_attrs, differs, width):
+        """Writes the cells of row i (counting from 0) that differ from what's
+        on screen, differs saying which do"""
+        import numpy
+        import cellframe
+        chars, attrs, known = self._screen
+        new_width = numpy.count_nonzero(new_chars)
+        if not known[i]:
+            self.tc.set_cursor_position((i + 1, 1))
+            self.tc.write(cellframe.encode(new_chars[:new_width], new_attrs[:new_width]))
+            if new_width < width:
+                self.tc.erase_rest_of_line()
+        elif differs.any():
+            changed = numpy.flatnonzero(differs)
+            start, end = changed[0], min(changed[-1] + 1, new_width)
+            if start < end:
+                self.tc.set_cursor_position((i + 1, start + 1))
+                self.tc.write(cellframe.encode(new_chars[start:end], new_attrs[start:end]))
+            if new_width < numpy.count_nonzero(chars[i]):
+                if start >= end:
+                    self.tc.set_cursor_position((i + 1, new_width + 1))
+                self.tc.erase_rest_of_line()
+        chars[i] = new_chars
+        attrs[i] = new_attrs
+        known[i] = True
 
-        self.tc.set_cursor_position((cursor_pos[0]-offscreen_scrolls+self.top_usable_row, cursor_pos[1]+1))
-        return offscreen_scrolls
+    def invalidate(self):
+        """Forget what's on screen so the next render redraws every row"""
+        self._rendered = {}
+        self._screen = None
 
     def array_from_text(self, msg):
         rows, columns = self.tc.get_screen_size()
@@ -162,5 +315,6 @@ def test_array_from_text():
     raw_input()
 
 if __name__ == '__main__':
+    logging.basicConfig(filename='terminal.log',level=logging.DEBUG)
     test_array_from_text()
     #test()
@@ -8,44 +8,102 @@ https://github.com/gwk/gloss/blob/master/python/gloss/io/cs.py
 """
 
 import os
+import errno
 import sys
 import tty
+import termios
+import fcntl
+import struct
 import signal
+import select
 import re
-import subprocess
 import logging
+from collections import namedtuple, deque
+from contextlib import contextmanager
 
 import events
+import keys
 
 
 _SIGWINCH_COUNTER = 0
 
+READ_SIZE = 4096
+ESC_TIMEOUT = .05
+
 QUERY_CURSOR_POSITION = "\x1b[6n"
 SCROLL_DOWN = "D"
 CURSOR_UP, CURSOR_DOWN, CURSOR_FORWARD, CURSOR_BACK = ["[%s" for char in 'ABCD']
 ERASE_REST_OF_LINE = "[K"
 ERASE_LINE = "[2K"
+BEGIN_SYNCHRONIZED_UPDATE = "[?2026h"
+END_SYNCHRONIZED_UPDATE = "[?2026l"
+
+BRACKETED_PASTE_ON = "\x1b[?2004h"
+BRACKETED_PASTE_OFF = "\x1b[?2004l"
+
+FrameStats = namedtuple('FrameStats', ['bytes', 'writes', 'flushes'])
 
 
+def kernel_screen_size(stream):
+    """Returns (rows, columns) of the tty stream is attached to, or None"""
+    try:
+        fd = stream.fileno()
+    except (AttributeError, IOError, ValueError):
+        return None
+    if not os.isatty(fd):
+        return None
+    try:
+        winsize = fcntl.ioctl(fd, termios.TIOCGWINSZ, struct.pack('HHHH', 0, 0, 0, 0))
+    except IOError:
+        return None
+    rows, columns, _, _ = struct.unpack('HHHH', winsize)
+    if not (rows and columns):
+        return None
+    return rows, columns
+
 def produce_simple_sequence(seq):
-    def func(out_stream):
-        out_stream.write(seq)
+    def func(self):
+        self.write(seq)
     return func
 
 def produce_cursor_sequence(char):
     """Returns a method that issues a cursor control sequence."""
     def func(self, n=1):
-        if n: self.out_stream.write("[%d%s" % (n, char))
+        if n: self.write("[%d%s" % (n, char))
     return func
 
 class TerminalController(object):
     """Returns terminal control functions partialed for stream returned by
     stream_getter on att lookup"""
-    def __init__(self, in_stream=sys.stdin, out_stream=sys.stdout):
+    def __init__(self, in_stream=sys.stdin, out_stream=sys.stdout, synchronized_output=False,
+                 esc_timeout=ESC_TIMEOUT, recording=None):
+        """
+        synchronized_output wraps each frame in the synchronized update
+        sequences so terminals that support them never show half a frame
+
+        esc_timeout is how many seconds to wait for the rest of an escape
+        sequence before deciding the escape key was pressed by itself
+
+        recording, a replay.Recorder, has every event get_event returns
+        passed to its record method
+        """
         self.in_stream = in_stream
         self.out_stream = out_stream
-        self.in_buffer = []
+        self.in_buffer = '' # input read but not yet split into key sequences
+        self.pending_events = deque()
+        self.key_trie = keys.default_trie()
+        self.esc_timeout = esc_timeout
         self.sigwinch_counter = _SIGWINCH_COUNTER - 1
+        self.screen_size = None
+        self.screen_size_counter = None
+        self.synchronized_output = synchronized_output
+        self.out_buffer = None # list of pending writes while in a frame
+        self.frame_depth = 0
+        self.frame_writes = 0
+        self.frame_flushes = 0
+        self.frame_bytes = 0
+        self.last_frame_stats = None
+        self.recording = recording
 
     def __enter__(self):
         def signal_handler(signum, frame):
@@ -53,14 +111,16 @@ class TerminalController(object):
             _SIGWINCH_COUNTER += 1
         signal.signal(signal.SIGWINCH, signal_handler)
 
-        #TODO implement this with termios/tty instead of subprocess
-        self.original_stty = subprocess.check_output(['stty', '-g'])
+        self.original_stty = termios.tcgetattr(self.in_stream)
         tty.setraw(self.in_stream)
+        self.write(BRACKETED_PASTE_ON)
         return self
 
     def __exit__(self, type, value, traceback):
+        self.write(BRACKETED_PASTE_OFF)
+        self.out_stream.flush()
         signal.signal(signal.SIGWINCH, lambda: None)
-        os.system('stty '+self.original_stty)
+        termios.tcsetattr(self.in_stream, termios.TCSADRAIN, self.original_stty)
 
     up, down, forward, back = [produce_cursor_sequence(c) for c in 'ABCD']
     fwd = forward
@@ -69,58 +129,160 @@ class TerminalController(object):
     erase_rest_of_line = produce_simple_sequence(ERASE_REST_OF_LINE)
     erase_line = produce_simple_sequence(ERASE_LINE)
 
-    def get_event(self):
-        """Blocks and returns the next event"""
-        #TODO make this cooler - generator? Trie?
-        chars = []
+    def get_event(self, timeout=None):
+        """Returns the next event, or None if timeout seconds pass without one
+
+        Blocks until there is an event if timeout is None."""
+        e = self.next_event(timeout)
+        if self.recording is not None and e is not None:
+            self.recording.record(e)
+        return e
+
+    def next_event(self, timeout=None):
         while True:
-            #logging.debug('checking if instance counter (%d) is less than global (%d) ' % (self.sigwinch_counter, _SIGWINCH_COUNTER))
             if self.sigwinch_counter < _SIGWINCH_COUNTER:
                 self.sigwinch_counter = _SIGWINCH_COUNTER
-                self.in_buffer = chars + self.in_buffer
                 return events.WindowChangeEvent(*self.get_screen_size())
-            if chars and chars[0] != '\x1b':
-                return ''.join(chars)
-            if len(chars) == 2 and chars[1] != '[':
-                return ''.join(chars)
-            if len(chars) > 2 and chars[1] == '[' and chars[-1] not in tuple('1234567890;'):
-                return ''.join(chars)
-            if self.in_buffer:
-                chars.append(self.in_buffer.pop(0))
-                continue
+            if self.pending_events:
+                return self.pending_events.popleft()
+            # an incomplete escape sequence only waits esc_timeout for the rest,
+            # but a paste isn't over until its end marker arrives
+            escape_pending = self.in_buffer and not self.in_buffer.startswith(keys.PASTE_START)
+            data = self.read_input(self.esc_timeout if escape_pending else timeout)
+            if data is None and not escape_pending:
+                if timeout is not None:
+                    return None
+                continue # interrupted, maybe by a window change
+            sequences, self.in_buffer = keys.decode(self.in_buffer + (data or ''),
+                                                    self.key_trie, final=not data)
+            self.pending_events.extend(sequences)
+            if data == '' and not self.pending_events:
+                return '' # end of input
+
+    def read_input(self, timeout=None):
+        """Returns whatever input is available, blocking until there is some
+
+        Returns None if timeout seconds pass or a signal interrupts the wait,
+        and '' at end of input."""
+        try:
+            fd = self.in_stream.fileno()
+        except (AttributeError, IOError, ValueError):
             try:
-                chars.append(self.in_stream.read(1))
+                return self.in_stream.read(1)
             except IOError:
-                continue
+                return None
+        try:
+            ready, _, _ = select.select([fd], [], [], timeout)
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                return None
+            raise
+        if not ready:
+            return None
+        try:
+            return os.read(fd, READ_SIZE)
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                return None
+            raise
 
     def retrying_read(self):
         while True:
-            try:
-                return self.in_stream.read(1)
-            except IOError:
-                logging.debug('read interrupted, retrying')
+            data = self.read_input()
+            if data is not None:
+                return data
+            logging.debug('read interrupted, retrying')
 
     def write(self, msg):
-        self.out_stream.write(msg)
+        if self.out_buffer is None:
+            self.out_stream.write(msg)
+        else:
+            self.out_buffer.append(msg)
+            self.frame_writes += 1
+
+    @contextmanager
+    def frame(self):
+        """Gathers everything written in the with block into a single write
+
+        Frames nest; only the outermost one writes. Byte and write counts for
+        the last frame are kept in last_frame_stats."""
+        if self.frame_depth == 0:
+            self.out_buffer = []
+            self.frame_writes = 0
+            self.frame_flushes = 0
+            self.frame_bytes = 0
+            if self.synchronized_output:
+                self.out_buffer.append(BEGIN_SYNCHRONIZED_UPDATE)
+        self.frame_depth += 1
+        try:
+            yield self
+        finally:
+            self.frame_depth -= 1
+            if self.frame_depth == 0:
+                if self.synchronized_output:
+                    self.out_buffer.append(END_SYNCHRONIZED_UPDATE)
+                self.flush()
+                self.out_buffer = None
+                self.last_frame_stats = FrameStats(self.frame_bytes,
+                                                   self.frame_writes,
+                                                   self.frame_flushes)
+
+    def flush(self):
+        """Sends pending frame output to the terminal with one write"""
+        if not self.out_buffer:
+            return
+        data = ''.join(self.out_buffer)
+        self.out_buffer[:] = []
+        self.frame_bytes += len(data)
+        self.frame_flushes += 1
+        try:
+            fd = self.out_stream.fileno()
+        except (AttributeError, IOError):
+            self.out_stream.write(data)
+            return
+        self.out_stream.flush()
+        while data:
+            try:
+                written = os.write(fd, data)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            data = data[written:]
 
     def get_cursor_position(self):
         """Returns the terminal (row, column) of the cursor"""
         self.query_cursor_position()
+        self.flush() # the query can't wait for the end of the frame
         resp = ''
         while True:
             c = self.retrying_read()
             resp += c
-            m = re.search('(?P<extra>.*)\x1b\[(?P<row>\\d+);(?P<column>\\d+)R', resp)
+            m = re.search('\x1b\[(?P<row>\\d+);(?P<column>\\d+)R', resp)
             if m:
                 row = int(m.groupdict()['row'])
                 col = int(m.groupdict()['column'])
-                self.in_buffer.extend(list(m.groupdict()['extra']))
+                # keys typed around the response are still to be processed
+                self.in_buffer += resp[:m.start()] + resp[m.end():]
                 return (row, col)
 
     def set_cursor_position(self, (row, col)):
-        self.out_stream.write("[%d;%dH" % (row, col))
+        self.write("[%d;%dH" % (row, col))
 
     def get_screen_size(self):
+        """Returns the terminal (rows, columns), cached until the next SIGWINCH"""
+        if self.screen_size is None or self.screen_size_counter != _SIGWINCH_COUNTER:
+            self.screen_size_counter = _SIGWINCH_COUNTER
+            self.screen_size = (kernel_screen_size(self.out_stream) or
+                                kernel_screen_size(self.in_stream) or
+                                self.query_screen_size())
+        return self.screen_size
+
+    def query_screen_size(self):
+        """Finds the screen size by moving the cursor as far as it will go
+
+        Needs two round trips to the terminal, so only used when neither
+        stream is a tty"""
         #TODO generalize get_cursor_position code and use it here instead
         orig = self.get_cursor_position()
         self.fwd(10000) # 10000 is much larger than any reasonable terminal
@@ -0,0 +1,54 @@
+import unittest
+
+from bpython.autocomplete import Autocomplete, SIMPLE
+from bpython.config import Struct
+from scottsright.completion import CompletionCache, CachingAutocomplete
+
+class TestCachingAutocomplete(unittest.TestCase):
+
+    def setUp(self):
+        self.config = Struct()
+        self.config.autocomplete_mode = SIMPLE
+        self.namespace = {'abcdef': 1, 'abcxyz': len, 'obj': Struct()}
+        self.namespace['obj'].spam = self.namespace['obj'].spammer = 1
+        self.cache = CompletionCache()
+        self.scans = []
+        completer = CachingAutocomplete(self.namespace, self.config, self.cache)
+        original = completer.global_pairs
+        def global_pairs(text):
+            self.scans.append(text)
+            return original(text)
+        completer.global_pairs = global_pairs
+        self.completer = completer
+
+    def matches(self, completer, text):
+        completer.complete(text, 0)
+        return completer.matches
+
+    def test_matches_autocomplete(self):
+        plain = Autocomplete(self.namespace, self.config)
+        for text in ['a', 'ab', 'abcx', 'l', 'le', 'obj.', 'obj.sp', 'obj.spamm']:
+            self.assertEqual(self.matches(self.completer, text), self.matches(plain, text))
+
+    def test_extending_narrows(self):
+        self.assertEqual(self.matches(self.completer, 'ab'), ['abcdef', 'abcxyz(', 'abs('])
+        self.assertEqual(self.matches(self.completer, 'abc'), ['abcdef', 'abcxyz('])
+        self.assertEqual(self.matches(self.completer, 'abcd'), ['abcdef'])
+        self.assertEqual(self.scans, ['ab'])
+
+    def test_attributes_cached_per_object(self):
+        self.matches(self.completer, 'obj.sp')
+        self.namespace['obj'].spamlet = 1
+        self.assertEqual(self.matches(self.completer, 'obj.spam'), ['obj.spam', 'obj.spammer'])
+
+    def test_new_version_rescans(self):
+        self.matches(self.completer, 'ab')
+        self.namespace['abacus'] = 1
+        self.cache.bump()
+        completer = CachingAutocomplete(self.namespace, self.config, self.cache)
+        self.assertEqual(self.matches(completer, 'aba'), ['abacus'])
+        self.matches(self.completer, 'abc') # made for the old version
+        self.assertEqual(self.cache.names.keys(), ['aba'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from scottsright.moduleindex import ModuleIndex
+
+class TestModuleIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.entry = os.path.join(self.dir, 'site')
+        os.makedirs(os.path.join(self.entry, 'pkg'))
+        for name in ['spam.py', os.path.join('pkg', '__init__.py'), os.path.join('pkg', 'eggs.py')]:
+            open(os.path.join(self.entry, name), 'w').close()
+        self.filename = os.path.join(self.dir, 'cache', 'modules.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def index(self):
+        return ModuleIndex(self.filename, [self.entry])
+
+    def touch_later(self, path):
+        """Adds a module at path, making sure its directory's mtime changes"""
+        mtime = os.stat(os.path.dirname(path)).st_mtime
+        open(path, 'w').close()
+        os.utime(os.path.dirname(path), (mtime + 1, mtime + 1))
+
+    def test_scan_and_reload(self):
+        index = self.index()
+        self.assertFalse(index.load())
+        self.assertTrue(index.refresh())
+        self.assertTrue(set(['spam', 'pkg', 'pkg.eggs']) <= index.modules())
+        index.save()
+        loaded = self.index()
+        self.assertTrue(loaded.load())
+        self.assertEqual(loaded.modules(), index.modules())
+        self.assertFalse(loaded.refresh())
+
+    def test_changed_directories_are_rescanned(self):
+        index = self.index()
+        index.refresh()
+        index.save()
+        self.touch_later(os.path.join(self.entry, 'pkg', 'ham.py'))
+        loaded = self.index()
+        loaded.load()
+        self.assertEqual(loaded.stale(), [self.entry])
+        self.assertTrue(loaded.refresh())
+        self.assertIn('pkg.ham', loaded.modules())
+
+    def test_other_pythons_index_ignored(self):
+        index = self.index()
+        index.refresh()
+        index.save()
+        with open(self.filename) as f:
+            saved = f.read()
+        with open(self.filename, 'w') as f:
+            f.write(saved.replace('"python": "', '"python": "0'))
+        self.assertFalse(self.index().load())
+
+    def test_concurrent_saves_leave_one_index(self):
+        first, second = self.index(), self.index()
+        first.refresh()
+        second.refresh()
+        first.save()
+        second.save()
+        self.assertEqual(os.listdir(os.path.dirname(self.filename)), ['modules.json'])
+        self.assertTrue(self.index().load())
+
+if __name__ == '__main__':
+    unittest.main()
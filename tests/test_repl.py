@@ -0,0 +1,598 @@
+import os
+import sys
+import json
+import signal
+import tempfile
+import time
+import threading
+import unittest
+
+from fmtstr.fmtstr import fmtstr
+from scottsright import events
+from bpython.repl import Repl as BpythonRepl
+from bpython._py3compat import PythonLexer
+from scottsright.repl import Repl as BaseRepl, load_config
+from scottsright.displaylines import Scrollback
+from scottsright.cellframe import CellFrame
+from scottsright.checkpoints import Checkpoints
+
+def Repl():
+    """A repl that leaves the module index in the user's cache alone"""
+    config = load_config()
+    config.module_index = ''
+    return BaseRepl(config)
+
+class TestRepl(unittest.TestCase):
+
+    def setUp(self):
+        self.repl = Repl()
+        self.repl.__enter__()
+        self.repl.width = 50
+        self.repl.height = 10
+
+    def tearDown(self):
+        self.repl.__exit__()
+
+    def type(self, keys):
+        for key in keys:
+            self.repl.process_event(key)
+
+    def test_paste_runs_completed_lines(self):
+        self.repl.process_event(events.PasteEvent('a = 1\nb = a + 1'))
+        self.assertEqual(self.repl.history, ['a = 1'])
+        self.assertEqual(self.repl._current_line, 'b = a + 1')
+        self.assertEqual(self.repl.cursor_offset_in_line, len('b = a + 1'))
+        self.type('\r')
+        self.assertEqual(self.repl.interp.locals['b'], 2)
+
+    def test_paste_mid_line(self):
+        self.type('x = ()')
+        self.repl.cursor_offset_in_line = len('x = (')
+        self.repl.process_event(events.PasteEvent('1,\r2'))
+        self.assertEqual(self.repl.history, ['x = (1,'])
+        self.assertEqual(self.repl._current_line, '2)')
+        self.assertEqual(self.repl.cursor_offset_in_line, 1)
+        self.type('\r')
+        self.assertEqual(self.repl.interp.locals['x'], (1, 2))
+
+    def test_paste_keeps_its_own_indentation(self):
+        self.repl.process_event(events.PasteEvent('def f():\r    return 3\r\rx = f()\r'))
+        self.assertEqual(self.repl.interp.locals['x'], 3)
+
+    def test_paste_skips_abbreviations(self):
+        self.repl.process_event(events.PasteEvent('form'))
+        self.assertEqual(self.repl._current_line, 'form')
+
+    def test_paste_matches_typing(self):
+        typed = Repl()
+        with typed:
+            typed.width, typed.height = 50, 10
+            for c in 'x = [1, 2]\rx':
+                typed.process_event(c)
+        self.repl.process_event(events.PasteEvent('x = [1, 2]\rx'))
+        self.assertEqual([str(line) for line in typed.lines_for_display],
+                         [str(line) for line in self.repl.lines_for_display])
+        self.assertEqual(str(typed.current_formatted_line),
+                         str(self.repl.current_formatted_line))
+
+class TestDisplayLines(unittest.TestCase):
+
+    def setUp(self):
+        self.repl = Repl()
+        self.repl.__enter__()
+        self.repl.width = 20
+        self.repl.height = 10
+
+    def tearDown(self):
+        self.repl.__exit__()
+
+    def test_lines_for_display(self):
+        for c in '1 + 1\rif True:\r':
+            self.repl.process_event(c)
+        self.assertEqual([str(fmtstr(line).s) for line in self.repl.lines_for_display],
+                         ['>>> 1 + 1', '2', '>>> if True:'])
+
+    def test_display_buffer_wrapping_cached(self):
+        for c in 'if True:\r':
+            self.repl.process_event(c)
+        self.repl.paint()
+        first = self.repl.display_buffer_wraps.cache[0][1]
+        self.repl.paint()
+        self.assertIs(self.repl.display_buffer_wraps.cache[0][1], first)
+        self.repl.width = 10
+        self.assertEqual([line.s for line in self.repl.display_buffer_lines],
+                         ['>>> if Tru', 'e:'])
+
+    def test_scrollback_is_bounded(self):
+        self.repl.display_lines.max_lines = 5
+        self.repl.scroll_offset = 10
+        for c in 'print "\\n".join(map(str, range(10)))\r':
+            self.repl.process_event(c)
+        self.assertEqual(list(self.repl.display_lines), ['5', '6', '7', '8', '9'])
+        self.repl.paint()
+        self.assertEqual(self.repl.scroll_offset, 10 - 7) # 2 input lines, 10 output
+
+    def test_reflow_on_resize(self):
+        for c in 'print "x" * 30\r':
+            self.repl.process_event(c)
+        self.assertEqual([str(line) for line in self.repl.display_lines][-2:],
+                         ['x' * 20, 'x' * 10])
+        self.repl.process_event(events.WindowChangeEvent(10, 40))
+        self.assertEqual([str(line) for line in self.repl.display_lines][-1:],
+                         ['x' * 30])
+
+    def test_only_visible_lines_wrapped(self):
+        wrapped = []
+        def wrap(line, width):
+            wrapped.append(line)
+            return [line]
+        scrollback = Scrollback(wrap)
+        scrollback.width = 20
+        scrollback.extend(str(i) for i in range(10000))
+        self.repl.display_lines = scrollback
+        self.repl.scroll_offset = 10000 - 9 # as if all but 9 had scrolled offscreen
+        self.repl.paint()
+        self.assertEqual(len(wrapped), 9)
+
+    def test_resizing_back_and_forth_rewraps_nothing(self):
+        wrapped = []
+        def wrap(line, width):
+            wrapped.append(line)
+            return [line]
+        scrollback = Scrollback(wrap)
+        scrollback.extend(str(i) for i in range(100))
+        for width in range(20, 31) * 2:
+            scrollback.width = width
+            scrollback[-9:]
+        self.assertEqual(len(wrapped), 9 * 11)
+
+    def test_long_lines_wrapped_a_bit_at_a_time(self):
+        wrapped = []
+        def wrap(line, width):
+            wrapped.append(len(line))
+            return [line[i:i+width] for i in range(0, len(line), width)]
+        scrollback = Scrollback(wrap)
+        scrollback.width = 20
+        scrollback.extend(['x' * 100000, 'y'])
+        self.repl.display_lines = scrollback
+        self.repl.scroll_offset = len(scrollback) - 9
+        self.repl.paint()
+        self.assertEqual(wrapped, [20 * 8, 1])
+
+    def test_long_output_collapsed(self):
+        self.repl.config.collapse_output = 3
+        for c in 'print "\\n".join(map(str, range(10)))\r':
+            self.repl.process_event(c)
+        self.assertEqual([fmtstr(line).s for line in self.repl.display_lines.lines][1:],
+                         ['0', '1', '2', '... 7 more lines: ctrl-o to page through them'])
+        self.repl.process_event('\x0f')
+        rows, _ = self.repl.paint()
+        self.assertEqual([row.s for row in rows[:3]], ['3', '4', '5'])
+        self.repl.process_event('e')
+        self.assertIsNone(self.repl.pager)
+        self.assertEqual([fmtstr(line).s for line in self.repl.display_lines.lines][1:],
+                         [str(i) for i in range(10)])
+
+    def test_long_line_collapsed(self):
+        self.repl.config.collapse_output = 3
+        for c in 'print "x" * 100\r':
+            self.repl.process_event(c)
+        self.assertEqual([fmtstr(line).s for line in self.repl.display_lines.lines][1:],
+                         ['x' * 60, '... 1 more lines: ctrl-o to page through them'])
+        self.assertEqual(list(self.repl.collapsed.lines), ['x' * 40])
+
+    def test_collapsed_output_capped_like_scrollback(self):
+        self.repl.config.collapse_output = 3
+        self.repl.config.scrollback_lines = 100
+        for c in 'print "\\n".join(map(str, range(100000)))\r':
+            self.repl.process_event(c)
+        collapsed = self.repl.collapsed
+        self.assertEqual(list(collapsed.lines), [str(i) for i in range(99900, 100000)])
+        self.assertEqual(collapsed.dropped, 100000 - 3 - 100)
+        self.assertEqual(fmtstr(self.repl.display_lines.lines[-1]).s,
+                         '... 99997 more lines: ctrl-o to page through them')
+        self.repl.process_event('\x0f')
+        self.repl.width = 100
+        rows, _ = self.repl.paint()
+        self.assertIn('(99897 lines before dropped)', rows[-1].s)
+
+class TestRunningInBackground(unittest.TestCase):
+
+    def setUp(self):
+        self.repl = Repl()
+        self.repl.__enter__()
+        self.repl.width = 50
+        self.repl.height = 10
+        self.repl.run_in_background = True
+        self.go = threading.Event()
+        self.repl.interp.locals['go'] = self.go
+
+    def tearDown(self):
+        self.go.set()
+        self.repl.runner.wait()
+        self.repl.__exit__()
+
+    def type(self, keys):
+        for key in keys:
+            self.repl.process_event(key)
+
+    def finish(self):
+        self.repl.runner.wait()
+        self.repl.update_running()
+
+    def lines(self):
+        return [fmtstr(line).s for line in self.repl.lines_for_display]
+
+    def test_output_shown_while_running(self):
+        self.type('print 1; w = go.wait(); print 2\r')
+        while not self.repl.update_running():
+            self.repl.runner.wait(.01)
+        self.assertTrue(self.repl.running)
+        self.assertEqual(self.lines(), ['>>> print 1; w = go.wait(); print 2', '1'])
+        self.assertEqual(self.repl.current_display_line.s, '')
+        self.go.set()
+        self.finish()
+        self.assertEqual(self.lines(), ['>>> print 1; w = go.wait(); print 2', '1', '2'])
+        self.assertEqual(self.repl.current_display_line.s, '>>> ')
+
+    def test_typing_while_running(self):
+        self.type('w = go.wait()\rx = 1\r')
+        self.assertNotIn('x', self.repl.interp.locals)
+        self.go.set()
+        self.finish()
+        self.finish()
+        self.assertEqual(self.repl.interp.locals['x'], 1)
+        self.assertEqual(self.repl.history, ['w = go.wait()', 'x = 1'])
+
+    def test_ctrl_c_interrupts(self):
+        # the loop mustn't hold a lock when interrupted, as go.set() would
+        looping = []
+        self.repl.interp.locals['looping'] = looping
+        self.type('while True: looping[:] = [True]\r')
+        self.finish()
+        self.type('\r')
+        while not looping:
+            self.repl.runner.wait(.001)
+        self.assertTrue(self.repl.running)
+        self.repl.process_event('\x03')
+        self.finish()
+        self.assertFalse(self.repl.running)
+        self.assertEqual(self.lines()[-1], 'KeyboardInterrupt')
+
+    def test_ctrl_c_interrupts_blocking_call(self):
+        self.type('import time\r')
+        self.finish()
+        self.type('time.sleep(30)\r')
+        self.repl.runner.wait(.1)
+        self.repl.process_event('\x03')
+        self.assertTrue(self.repl.runner.wait(5))
+        self.finish()
+        self.assertEqual(self.lines()[-1], 'KeyboardInterrupt')
+
+    def test_thread_local_state_kept(self):
+        for line in ['import decimal', 'decimal.getcontext().prec = 3',
+                     'print decimal.Decimal(1) / 3']:
+            self.type(line + '\r')
+            self.finish()
+        self.assertEqual(self.lines()[-1], '0.333')
+
+    def test_paste_runs_in_background(self):
+        self.type([events.PasteEvent('w = go.wait()\rif w:\r    x = 1\r\ry = x')])
+        self.assertTrue(self.repl.running)
+        self.assertNotIn('x', self.repl.interp.locals)
+        self.go.set()
+        while self.repl.running: # each line runs in the background in turn
+            self.finish()
+        self.assertEqual(self.repl.interp.locals['x'], 1)
+        self.assertEqual(self.repl.history, ['w = go.wait()', 'if w:', '    x = 1', ''])
+        self.assertEqual(self.repl._current_line, 'y = x')
+        self.assertFalse(self.repl.paste_mode)
+
+    def test_paste_mid_line_runs_in_background(self):
+        self.type('x = []')
+        self.repl.cursor_offset_in_line = len('x = [')
+        self.type([events.PasteEvent('go.wait(),\r3')])
+        self.assertTrue(self.repl.running)
+        self.go.set()
+        while self.repl.running:
+            self.finish()
+        self.assertEqual(self.repl._current_line, '3]')
+        self.assertEqual(self.repl.cursor_offset_in_line, 1)
+
+    def test_ctrl_c_drops_rest_of_paste(self):
+        self.type([events.PasteEvent('import time\rtime.sleep(30)\rx = 1\r')])
+        self.finish()
+        self.assertTrue(self.repl.running)
+        self.repl.runner.wait(.1)
+        self.repl.process_event('\x03')
+        self.assertTrue(self.repl.runner.wait(5))
+        self.finish()
+        self.assertFalse(self.repl.running)
+        self.assertNotIn('x', self.repl.interp.locals)
+        self.assertEqual(self.lines()[-1], 'KeyboardInterrupt')
+        self.assertEqual(self.repl._current_line, '')
+
+    def test_ctrl_c_interrupts_replayed_line(self):
+        presses = iter([False, False, True])
+        self.repl.interrupted = lambda: next(presses, False)
+        self.repl.replay(['import time', 'time.sleep(30)', 'x = 1'])
+        self.assertEqual(self.repl.interp.locals['x'], 1)
+        self.assertIn('KeyboardInterrupt', self.lines())
+
+class TestHighlighting(unittest.TestCase):
+
+    def setUp(self):
+        self.repl = Repl()
+        self.repl.__enter__()
+        self.repl.width = 50
+        self.repl.height = 10
+
+    def tearDown(self):
+        self.repl.__exit__()
+
+    def test_matches_bpython(self):
+        for c in 'if foo(1, [2]):\r    x = "a(b" + bar\x1b[D\x1b[D\x1b[D':
+            self.repl.process_event(c)
+            tokens = self.repl.tokenize(self.repl._current_line)
+            self.assertEqual(tokens, BpythonRepl.tokenize(self.repl, self.repl._current_line))
+
+    def test_typing_relexes_only_the_tail(self):
+        self.repl.config.auto_display_list = False # nothing else lexing lines first
+        for c in 'x = foo(1, 2) + ' + 'bar' * 100:
+            self.repl.process_event(c)
+        self.assertEqual(self.repl.highlighter.lexer.relexed, len('+ ' + 'bar' * 100 + '\n'))
+        for c in '(12':
+            self.repl.process_event(c)
+        self.assertEqual(self.repl.highlighter.lexer.relexed, len('(12\n'))
+
+    def test_lexer_shared_between_threads(self):
+        lexer = self.repl.highlighter.lexer
+        long_source = 'x = [' + '1, ' * 100
+        errors = []
+        results = []
+        def lex(source, keep_going):
+            try:
+                i = 0
+                while keep_going(i):
+                    tokens = lexer.lex(source + '1' * (i % 2))
+                    i += 1
+                tokens = lexer.lex(source + '1')
+            except Exception as e:
+                errors.append(e)
+            else:
+                results.append(tokens == list(PythonLexer().get_tokens(source + '1')))
+        long_thread = threading.Thread(target=lex, args=(long_source, lambda i: i < 3000))
+        short_thread = threading.Thread(target=lex, args=('x = [', lambda i: long_thread.is_alive()))
+        interval = sys.getcheckinterval()
+        sys.setcheckinterval(1) # switching threads as often as can be
+        try:
+            long_thread.start()
+            short_thread.start()
+            long_thread.join()
+            short_thread.join()
+        finally:
+            sys.setcheckinterval(interval)
+        self.assertEqual(errors, [])
+        self.assertEqual(results, [True, True])
+
+    def test_formatted_lines_are_copies(self):
+        first = self.repl.highlighter.format(self.repl.tokenize('x = 1'))
+        first[:1] = 'y'
+        self.assertEqual(self.repl.highlighter.format(self.repl.tokenize('x = 1')).s, 'x = 1')
+
+class TestCompletion(unittest.TestCase):
+
+    def setUp(self):
+        self.repl = Repl()
+        self.repl.__enter__()
+        self.repl.width = 50
+        self.repl.height = 10
+        self.repl.config.auto_display_list = True
+        self.type('abcdef = 1\rabcxyz = 2\r')
+
+    def tearDown(self):
+        self.repl.__exit__()
+
+    def type(self, keys):
+        for key in keys:
+            self.repl.process_event(key)
+
+    def test_results_arrive_in_background(self):
+        self.type('abc')
+        self.assertTrue(self.repl.completion_worker.wait(5))
+        self.assertTrue(self.repl.update_completion())
+        self.assertEqual(self.repl.matches, ['abcdef', 'abcxyz'])
+        self.assertTrue(self.repl.list_win_visible)
+        self.assertFalse(self.repl.update_completion())
+
+    def test_stale_results_are_dropped(self):
+        started = threading.Event()
+        release = threading.Event()
+        def slow():
+            started.set()
+            release.wait(5)
+            return 'stale'
+        self.repl.completion_worker.submit(slow)
+        started.wait(5)
+        self.type('abcd')
+        release.set()
+        self.assertTrue(self.repl.completion_worker.wait(5))
+        self.repl.update_completion()
+        self.assertEqual(self.repl.matches, ['abcdef'])
+
+    def test_infobox_painted_into_frame(self):
+        self.type('abc')
+        self.assertTrue(self.repl.completion_worker.wait(5))
+        self.repl.update_completion()
+        rows, cursor = self.repl.paint()
+        frame = CellFrame(0)
+        self.assertEqual(self.repl.paint(frame=frame), (frame, cursor))
+        self.assertEqual([fmtstr(line) for line in frame.lines()], rows)
+        self.assertIn('abcxyz', frame.lines()[-2])
+
+    def test_completion_alongside_highlighting(self):
+        # completion tokenizes the line as typing does, on another thread
+        self.type('x = [abcd')
+        self.repl.display_buffer.append(self.repl.highlighter.format(self.repl.tokenize('(')))
+        display_buffer = list(self.repl.display_buffer)
+        self.repl.highlighter.tokens.size = 0 # so every line's lexed
+        snapshot = self.repl.completion_job()()
+        errors = []
+        def tokenize(repl, lengths):
+            try:
+                for i in lengths:
+                    repl.tokenize('x = [' + '1, ' * i)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=tokenize, args=(snapshot, range(100, 0, -1) * 20)),
+                   threading.Thread(target=tokenize, args=(self.repl, range(100) * 20))]
+        interval = sys.getcheckinterval()
+        sys.setcheckinterval(1) # switching threads as often as can be
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            sys.setcheckinterval(interval)
+        self.assertEqual(errors, [])
+        self.assertEqual(self.repl.display_buffer, display_buffer)
+
+    def test_tab_completes_current_line(self):
+        self.type('abcx')
+        self.repl.process_event('\t')
+        self.assertEqual(self.repl._current_line, 'abcxyz')
+
+class TestCheckpoints(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.ran = tempfile.mkstemp()
+        os.close(fd)
+        fd, self.result = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.ran)
+        os.remove(self.result)
+
+    def session(self, keys, after_undo):
+        """Types keys into a repl in a forked session, returning what
+        after_undo(repl) saved in whichever process got to the end of them
+
+        Keys are read from a pipe, so like keys read from a terminal, the
+        ones a process has read are gone for the checkpoint it resumes."""
+        r, w = os.pipe()
+        os.write(w, keys)
+        os.close(w)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                repl = Repl()
+                repl.__enter__()
+                repl.width, repl.height = 50, 10
+                repl.checkpoints.every = 2
+                repl.enable_checkpoints(lambda: 'state', lambda state: None)
+                key = os.read(r, 1)
+                while key:
+                    repl.process_event(key)
+                    key = os.read(r, 1)
+                with open(self.result, 'w') as f:
+                    json.dump(after_undo(repl), f)
+            finally:
+                os._exit(0)
+        os.close(r)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
+        with open(self.result) as f:
+            return json.load(f)
+
+    def line(self, n):
+        return 'open(%r, "a").write("%d")\r' % (self.ran, n)
+
+    def test_undo_resumes_checkpoint(self):
+        keys = self.line(1) + self.line(2) + self.line(3) + '\x12' + self.line(4)
+        history = self.session(keys, lambda repl: repl.history)
+        self.assertEqual(len(history), 3)
+        with open(self.ran) as f:
+            self.assertEqual(f.read(), '1234') # nothing from before line 2 rerun
+
+    def test_undo_reruns_lines_after_checkpoint(self):
+        keys = self.line(1) + self.line(2) + self.line(3) + self.line(4) + self.line(5) + '\x12\x12'
+        history = self.session(keys, lambda repl: repl.history)
+        self.assertEqual(len(history), 3)
+        with open(self.ran) as f:
+            self.assertEqual(f.read(), '123453') # line 3 again, from the checkpoint at line 2
+
+    def test_checkpoint_while_completing(self):
+        # the checkpoint only has the thread that forked it, so a lock
+        # another thread held then would never be let go of
+        pid = os.fork()
+        if pid == 0:
+            try:
+                repl = Repl()
+                repl.__enter__()
+                resumed = []
+                repl.enable_checkpoints(lambda: 'state', resumed.append)
+                started = threading.Event()
+                def complete():
+                    with repl.highlighter.tokens.lock:
+                        started.set()
+                        time.sleep(.2)
+                    time.sleep(5) # not waited for
+                repl.completion_worker.submit(complete)
+                started.wait(5)
+                began = time.time()
+                repl.checkpoint()
+                quick = time.time() - began < 2 # in either process
+                if not resumed:
+                    repl.reevaluate() # hands over to the checkpoint
+                with open(self.result, 'w') as f:
+                    json.dump([repl.highlighter.tokens.lock.acquire(False), quick], f)
+            finally:
+                os._exit(0)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
+        with open(self.result) as f:
+            self.assertEqual(json.load(f), [True, True])
+
+    def test_checkpoint_as_code_finishes(self):
+        # the code's thread may hold finished's lock, setting it, as the
+        # checkpoint forks; the checkpoint mustn't wait on it
+        repl = Repl()
+        repl.__enter__()
+        try:
+            repl.push('x = 1')
+            repl.runner.wait()
+            repl.finish_push()
+            held, done = threading.Event(), threading.Event()
+            def hold():
+                with repl.runner.finished._Event__cond:
+                    held.set()
+                    done.wait()
+            threading.Thread(target=hold).start()
+            held.wait()
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    signal.alarm(5) # rather than hang the tests
+                    repl.push('x = 2')
+                    with open(self.result, 'w') as f:
+                        json.dump(repl.runner.wait(5), f)
+                finally:
+                    os._exit(0)
+            done.set()
+        finally:
+            repl.__exit__()
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
+        with open(self.result) as f:
+            self.assertEqual(json.load(f), True)
+
+    def test_no_checkpoints_past_memory_limit(self):
+        checkpoints = Checkpoints(1, 1.0, 8, max_bytes=1)
+        self.assertFalse(checkpoints.due(5, 0))
+        checkpoints.max_bytes = 0
+        self.assertTrue(checkpoints.due(5, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+from cStringIO import StringIO
+
+from scottsright import events
+from scottsright.repl import load_config
+from scottsright.replay import Recorder, read_recording, replay
+
+class TestRecording(unittest.TestCase):
+
+    def test_recording_reads_back(self):
+        f = StringIO()
+        recorder = Recorder(f)
+        recorded = [events.WindowChangeEvent(5, 20), 'a', '\x1b[A', '\xc3\xa9',
+                    events.PasteEvent('x = 1\ry')]
+        for e in recorded:
+            recorder.record(e)
+        f.seek(0)
+        read = read_recording(f)
+        self.assertEqual([when for when, _ in read], sorted(when for when, _ in read))
+        self.assertEqual([repr(e) for _, e in read], [repr(e) for e in recorded])
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.config = load_config()
+        self.config.module_index = '' # leave the user's alone
+
+    def test_replay_times_each_event(self):
+        recorded = [(0, events.WindowChangeEvent(10, 40))] + [(0, c) for c in 'x = 6 * 7\rx']
+        latencies = replay(recorded, config=self.config)
+        self.assertEqual([e for _, e in latencies], [e for _, e in recorded])
+        self.assertTrue(all(s >= 0 for s, _ in latencies))
+
+    def test_replay_stops_when_repl_exits(self):
+        latencies = replay([(0, '\x04'), (0, 'a')], config=self.config)
+        self.assertEqual([e for _, e in latencies], ['\x04'])
+
+if __name__ == '__main__':
+    unittest.main()
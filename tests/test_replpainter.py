@@ -0,0 +1,46 @@
+import unittest
+
+from fmtstr.fmtstr import fmtstr
+from scottsright import replpainter as paint
+
+class CountingLines(object):
+    """Sequence of lines that remembers how many lines were looked at"""
+    def __init__(self, n):
+        self.n = n
+        self.looked_at = 0
+    def __len__(self):
+        return self.n
+    def __getitem__(self, index):
+        lines = ['line %d' % i for i in range(*index.indices(self.n))]
+        self.looked_at += len(lines)
+        return lines
+
+class TestPaintHistory(unittest.TestCase):
+
+    def test_only_visible_rows_looked_at(self):
+        lines = CountingLines(100000)
+        rows = paint.paint_history(3, 20, lines)
+        self.assertEqual([str(row) for row in rows], ['line 99997', 'line 99998', 'line 99999'])
+        self.assertEqual(lines.looked_at, 3)
+
+    def test_rows_not_padded(self):
+        rows = paint.paint_history(5, 4, ['ab', 'abcdef'])
+        self.assertEqual([str(row) for row in rows], ['ab', 'abcd'])
+
+class TestBlit(unittest.TestCase):
+
+    def test_adds_rows(self):
+        rows = paint.blit([fmtstr('a')], ['b', 'c'], 2)
+        self.assertEqual([str(row) for row in rows], ['a', '', 'b', 'c'])
+
+    def test_keeps_uncovered_cells(self):
+        rows = paint.blit([fmtstr('abcdef')], [fmtstr('X', 'red')], 0, 2)
+        self.assertEqual(rows[0].s, 'abXdef')
+        self.assertEqual(str(rows[0][2:3]), str(fmtstr('X', 'red')))
+
+    def test_pads_short_rows(self):
+        rows = paint.blit([fmtstr('a')], ['~'], 0, 3)
+        self.assertEqual(rows[0].s, 'a  ~')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+from cStringIO import StringIO
+
+from fmtstr.fmtstr import fmtstr
+from scottsright.terminal import Terminal, changed_span
+from scottsright.cellframe import CellFrame
+from scottsright.terminalcontrol import TerminalController
+
+import pyte
+
+class TestTerminalRendering(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = pyte.ByteStream()
+        self.written = []
+        class FakeOut(object):
+            def write(inner_self, data):
+                self.written.append(data)
+                self.stream.feed(data)
+        self.screen = pyte.Screen(10, 5)
+        self.stream.attach(self.screen)
+        self.tc = TerminalController(StringIO(), FakeOut())
+        self.tc.get_screen_size = lambda: (5, 10)
+        self.term = Terminal(self.tc)
+        self.term.top_usable_row = 1
+
+    def render(self, lines, cursor_pos=(0, 0)):
+        self.written[:] = []
+        self.term.render_to_terminal([fmtstr(line) for line in lines], cursor_pos)
+        return ''.join(self.written)
+
+    def assertScreen(self, lines):
+        self.assertEqual([line.rstrip() for line in self.screen.display],
+                         lines + [''] * (5 - len(lines)))
+
+    def test_changed_span(self):
+        self.assertEqual(changed_span([], list('ab')), (0, 2))
+        self.assertEqual(changed_span(list('abc'), list('abc')), (3, 3))
+        self.assertEqual(changed_span(list('abcd'), list('axcy')), (1, 4))
+
+    def test_first_render_draws_everything(self):
+        self.render(['>>> a', 'b'])
+        self.assertScreen(['>>> a', 'b'])
+
+    def test_unchanged_frame_writes_only_cursor(self):
+        self.render(['>>> a', 'b'])
+        output = self.render(['>>> a', 'b'], (1, 1))
+        self.assertEqual(output, '\x1b[2;2H')
+        self.assertScreen(['>>> a', 'b'])
+
+    def test_only_changed_cells_written(self):
+        self.render(['>>> abc', 'b'])
+        output = self.render(['>>> axc', 'b'])
+        self.assertEqual(output, '\x1b[1;6Hx\x1b[1;1H')
+        self.assertScreen(['>>> axc', 'b'])
+
+    def test_shorter_line_erased(self):
+        self.render(['>>> abc', 'b'])
+        self.render(['>>> a', 'b'])
+        self.assertScreen(['>>> a', 'b'])
+        self.render(['>>> a'])
+        self.assertScreen(['>>> a'])
+
+    def test_formatting_change_redraws_cells(self):
+        self.render(['abc'])
+        output = self.render([fmtstr('a') + fmtstr('b', 'red') + 'c'])
+        self.assertEqual(output, '\x1b[1;2H\x1b[31mb\x1b[39m\x1b[1;1H')
+
+    def test_resize_redraws_everything(self):
+        self.render(['abc'])
+        self.tc.get_screen_size = lambda: (5, 9)
+        output = self.render(['abc'])
+        self.assertIn('abc', output)
+
+    def test_scrolling(self):
+        self.render(['1', '2', '3', '4', '5'])
+        scrolled = self.term.render_to_terminal(['1', '2', '3', '4', '5', '6'])
+        self.assertEqual(scrolled, 1)
+        self.assertScreen(['2', '3', '4', '5', '6'])
+        self.render(['2', '3', '4', '5', '7'])
+        self.assertScreen(['2', '3', '4', '5', '7'])
+
+class TestFrameRendering(TestTerminalRendering):
+    """The same again, rendering CellFrames"""
+
+    def frame(self, lines):
+        frame = CellFrame(10)
+        frame.blit(lines, 0)
+        return frame
+
+    def render(self, lines, cursor_pos=(0, 0)):
+        self.written[:] = []
+        self.term.render_to_terminal(self.frame(lines), cursor_pos)
+        return ''.join(self.written)
+
+    def test_formatting_change_redraws_cells(self):
+        self.render(['abc'])
+        output = self.render([fmtstr('a') + fmtstr('b', 'red') + 'c'])
+        self.assertEqual(output, '\x1b[1;2H\x1b[31mb\x1b[0m\x1b[1;1H')
+
+    def test_frame_scrolling(self):
+        self.render(['1', '2', '3', '4', '5'])
+        scrolled = self.term.render_to_terminal(self.frame(['1', '2', '3', '4', '5', '', '7']), (6, 0))
+        self.assertEqual(scrolled, 2)
+        self.assertScreen(['3', '4', '5', '', '7'])
+        output = self.render(['3', '4', '5', '', '7'], (4, 0))
+        self.assertEqual(output, '\x1b[5;1H')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,13 @@
+import os
+import pty
+import fcntl
+import termios
+import struct
 import unittest
-from scottsright.events import WindowChangeEvent
+from scottsright.events import WindowChangeEvent, PasteEvent
 from cStringIO import StringIO
-from scottsright.terminalcontrol import TerminalController
+from scottsright import terminalcontrol
+from scottsright.terminalcontrol import TerminalController, kernel_screen_size
 
 import pyte
 
@@ -110,7 +116,157 @@ class TestTerminalControllerWithScreen(unittest.TestCase):
         self.assertEqual(self.screen.cursor.y, 3)
         self.assertEqual(self.screen.cursor.x, 9)
 
-#TODO: tests for get_event: gnarly identification of escape sequences
+class TestKernelScreenSize(unittest.TestCase):
+
+    def setUp(self):
+        self.master, self.slave = pty.openpty()
+        self.set_size(24, 80)
+        self.out = os.fdopen(self.slave, 'w')
+        self.tc = TerminalController(StringIO(), self.out)
+
+    def tearDown(self):
+        self.out.close()
+        os.close(self.master)
+
+    def set_size(self, rows, columns):
+        fcntl.ioctl(self.slave, termios.TIOCSWINSZ,
+                    struct.pack('HHHH', rows, columns, 0, 0))
+
+    def test_kernel_screen_size(self):
+        self.assertEqual(kernel_screen_size(self.out), (24, 80))
+        self.assertEqual(kernel_screen_size(StringIO()), None)
+
+    def test_cached_until_sigwinch(self):
+        self.assertEqual(self.tc.get_screen_size(), (24, 80))
+        self.set_size(30, 100)
+        self.assertEqual(self.tc.get_screen_size(), (24, 80))
+        terminalcontrol._SIGWINCH_COUNTER += 1
+        self.assertEqual(self.tc.get_screen_size(), (30, 100))
+
+class TestFrame(unittest.TestCase):
+
+    def setUp(self):
+        self.writes = []
+        class FakeOut(object):
+            def write(inner_self, data):
+                self.writes.append(data)
+        self.tc = TerminalController(StringIO(), FakeOut())
+
+    def test_writes_outside_frame_go_straight_out(self):
+        self.tc.write('a')
+        self.tc.up()
+        self.assertEqual(self.writes, ['a', '\x1b[1A'])
+
+    def test_frame_is_written_once(self):
+        with self.tc.frame():
+            self.tc.set_cursor_position((2, 3))
+            self.tc.write('hello')
+            self.tc.erase_rest_of_line()
+            self.assertEqual(self.writes, [])
+        self.assertEqual(self.writes, ['\x1b[2;3Hhello\x1b[K'])
+        self.assertEqual(self.tc.last_frame_stats, (14, 3, 1))
+
+    def test_nested_frames(self):
+        with self.tc.frame():
+            self.tc.write('a')
+            with self.tc.frame():
+                self.tc.write('b')
+            self.tc.write('c')
+        self.assertEqual(self.writes, ['abc'])
+
+    def test_synchronized_output(self):
+        self.tc.synchronized_output = True
+        with self.tc.frame():
+            self.tc.write('a')
+        self.assertEqual(self.writes, ['\x1b[?2026ha\x1b[?2026l'])
+
+    def test_frame_uses_file_descriptor(self):
+        r, w = os.pipe()
+        out = os.fdopen(w, 'w')
+        tc = TerminalController(StringIO(), out)
+        with tc.frame():
+            for c in 'hello':
+                tc.write(c)
+        out.close()
+        self.assertEqual(os.read(r, 100), 'hello')
+        os.close(r)
+
+class TestGetEvent(unittest.TestCase):
+
+    def events_from(self, data, n):
+        tc = TerminalController(StringIO(data), StringIO())
+        tc.sigwinch_counter = terminalcontrol._SIGWINCH_COUNTER
+        return [tc.get_event() for _ in range(n)]
+
+    def test_plain_characters(self):
+        self.assertEqual(self.events_from('ab\r', 3), ['a', 'b', '\r'])
+
+    def test_escape_sequences(self):
+        self.assertEqual(self.events_from('\x1b[Aa\x1b[3~\x1bOP\x1bf', 5),
+                         ['\x1b[A', 'a', '\x1b[3~', '\x1bOP', '\x1bf'])
+
+    def test_unknown_csi_sequence(self):
+        self.assertEqual(self.events_from('\x1b[99;2qx', 2), ['\x1b[99;2q', 'x'])
+
+    def test_bare_escape_at_end_of_input(self):
+        self.assertEqual(self.events_from('a\x1b', 3), ['a', '\x1b', ''])
+
+    def test_bare_escape_times_out(self):
+        r, w = os.pipe()
+        tc = TerminalController(os.fdopen(r), StringIO(), esc_timeout=.01)
+        tc.sigwinch_counter = terminalcontrol._SIGWINCH_COUNTER
+        os.write(w, '\x1b')
+        self.assertEqual(tc.get_event(), '\x1b')
+        os.write(w, '\x1b[')
+        os.write(w, 'B')
+        self.assertEqual(tc.get_event(), '\x1b[B')
+        os.close(w)
+
+    def test_bracketed_paste(self):
+        paste, after = self.events_from('\x1b[200~a\rb\x1b[A\x1b[201~c', 2)
+        self.assertIsInstance(paste, PasteEvent)
+        self.assertEqual(paste.text, 'a\rb\x1b[A')
+        self.assertEqual(after, 'c')
+
+    def test_bulk_read(self):
+        r, w = os.pipe()
+        tc = TerminalController(os.fdopen(r), StringIO())
+        tc.sigwinch_counter = terminalcontrol._SIGWINCH_COUNTER
+        os.write(w, 'x' * 1000 + '\x1b[C')
+        self.assertEqual([tc.get_event() for _ in range(1001)], ['x'] * 1000 + ['\x1b[C'])
+        self.assertEqual(tc.in_buffer, '')
+        os.close(w)
+
+    def test_timeout(self):
+        r, w = os.pipe()
+        tc = TerminalController(os.fdopen(r), StringIO())
+        tc.sigwinch_counter = terminalcontrol._SIGWINCH_COUNTER
+        self.assertEqual(tc.get_event(timeout=0), None)
+        os.write(w, 'ab')
+        self.assertEqual(tc.get_event(timeout=0), 'a')
+        self.assertEqual(tc.get_event(timeout=0), 'b')
+        self.assertEqual(tc.get_event(timeout=0), None)
+        os.close(w)
+
+    def test_window_change(self):
+        tc = TerminalController(StringIO('a'), StringIO())
+        tc.get_screen_size = lambda: (5, 10)
+        e = tc.get_event()
+        self.assertIsInstance(e, WindowChangeEvent)
+        self.assertEqual((e.rows, e.columns), (5, 10))
+        self.assertEqual(tc.get_event(), 'a')
+
+    def test_recording(self):
+        recorded = []
+        class FakeRecorder(object):
+            def record(self, e):
+                recorded.append(e)
+        tc = TerminalController(StringIO('ab'), StringIO(), recording=FakeRecorder())
+        tc.sigwinch_counter = terminalcontrol._SIGWINCH_COUNTER
+        events = [tc.get_event() for _ in range(3)]
+        self.assertEqual(recorded, events)
+        self.assertEqual(recorded, ['a', 'b', ''])
+
 #TODO: tests context manager
 #TODO: tests for retrying_read
 